@@ -199,7 +199,7 @@
 #
 #     # Remover palabras no-X y números, buscar palabras de 4+ letras
 #     palabras = re.findall(r"[a-zA-Z]{4,}", texto_limpio)  # Solo palabras de 4+ letras
-#     palabras_filtradas = [p for p in palabras if p not in palabras_no_x]
+#     palabras_filtradas = [p for p in palabras if p not in PALABRAS_NO_X]
 #
 #     # También verificar si hay signos de múltiples medicamentos (+, &, "y", "con")
 #     tiene_multiples = bool(re.search(r"\+|\&| y | con |/\s*[a-zA-Z]", texto))
@@ -337,7 +337,7 @@
 #             registro_procesado = {}
 #
 #             # Copiar solo las columnas especificadas
-#             for columna in columnas_conservar:
+#             for columna in COLUMNAS_CONSERVAR:
 #                 if columna in fila:
 #                     registro_procesado[columna] = fila[columna]
 #                 else:
@@ -417,85 +417,433 @@ import pandas as pd
 import numpy as np
 import os
 import re
+import io
+import json
+import codecs
+import gzip
+import contextlib
+import shutil
+import time
+import hashlib
+import platform
+import resource
+import threading
+import cProfile
+from datetime import datetime
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pandas.api.types import union_categoricals
+
+# pyarrow es opcional: solo se necesita para la caché columnar de entradas, el "dirty" en Parquet/Feather
+# y el final particionado
+try:
+    import pyarrow
+    import pyarrow.dataset
+except ImportError:
+    pyarrow = None
+
+# pyinstrument es opcional: perfilador por muestreo para main(perfilar=True); sin él se usa cProfile
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# El catálogo y la clasificación de textos viven en clasificador (sin pandas); aquí quedan las etapas de E/S
+# y con DataFrames
+import clasificador
+from clasificador import (
+    CATALOGO, ORDEN_GRUPOS, ETIQUETAS_GRUPOS, MEDICAMENTOS_EXACTOS, ABREVIATURAS_GE, ABREVIATURA_GE_AMBOS,
+    PATRON_MEDICAMENTOS, PALABRAS_NO_X, PALABRAS_NO_X_PLEGADAS, BITS_GRUPOS, PATRON_TOKENS, TABLA_CATEGORIAS,
+    DISTANCIA_MAXIMA_TYPOS, TokensMedicamento, CorrectorMedicamentos, normalizar_texto, plegar_acentos,
+    buscar_medicamentos_exactos, buscar_medicamentos_exactos_referencia, recorrer_medicamento, tokenizar_medicamento,
+    medicamentos_de_texto, categoria_de_tokens, tiene_medicamento_x,
+    determinar_categorizacion_por_registro, construir_categorizacion, es_registro_de_interes, grupos_de_mascara,
+    huella_catalogo, inicializar_trabajador, clasificar_particion,
+)
+
+
+# Formatos de fecha de los extractos (FechaOrden, fecha_consulta), en orden de preferencia
+FORMATOS_FECHA = ["%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S"]
+
+# Columnas de fecha que se convierten a datetime64 al normalizar fechas
+COLUMNAS_FECHA = ["Fechnac", "FechaOrden"]
+
+# Limpieza de Frecuencia (variantes y typos de HORAS y DIARIA observados), en orden de aplicación
+REEMPLAZOS_FRECUENCIA = [(re.compile(patron), reemplazo) for patron, reemplazo in [
+    (r"\s+", " "), (r"CADA\s*", "CADA "),
+    (r"\bHORA(S?)\b", "HORAS"), (r"\bHO\b", "HORAS"), (r"\bHOR\b", "HORAS"),
+    (r"HOR1", "HORAS"), (r"HORA1", "HORAS"), (r"HORA4", "HORAS"),
+    (r"\bDIARI(A?)(O?)\b", "DIARIA"), (r"\bDIAR\b", "DIARIA"), (r"\bDIA\b", "DIARIA"),
+    (r"DIAR6", "DIARIA"), (r"DIARI1", "DIARIA"), (r"DIARI2", "DIARIA"),
+    (r"\bDOSIS UNICA\b", "DOSIS_UNICA"),
+]]
+
+# Frecuencia ya limpia -> horas: patrones con número (en orden) y palabras con horas fijas
+PATRONES_HORAS = [re.compile(r"CADA\s*(\d+\.?\d*)\s*HORAS"), re.compile(r"(\d+\.?\d*)\s*HORAS")]
+PATRON_CADA_DIARIA = re.compile(r"CADA\s*DIARIA")
+PATRON_CADA_NUMERO = re.compile(r"CADA\s*(\d+\.?\d*)$")
+HORAS_POR_PALABRA = {"SEMANAL": 168, "MENSUAL": 720, "ANUAL": 8760, "INTERDIARIA": 48}
+
+# Primer número de un texto (Dosis, TTratamiento) y dosis en mg dentro del texto de Medicamento
+PATRON_NUMERO = re.compile(r"(\d+\.?\d*)")
+PATRONES_MG = [re.compile(r"(\d+\.?\d*)\s*MG"), re.compile(r"(\d+\.?\d*)\s*mg")]
+
+# Separadores de los componentes de un medicamento combinado: "+", "&", " y " y "/" seguido de una letra
+# ("VALSARTAN / AMLODIPINO"; en "160 MG / 5 MG" la barra separa dosis, no componentes). Un trozo que empieza
+# con un número es solo dosis o presentación ("12.5 MG TABLETA") y no cuenta como componente
+PATRON_SEPARADOR_COMPONENTES = re.compile(r"\s*(?:\+|&|/(?=\s*[^\W\d_])|\s[yY]\s)\s*")
+PATRON_SOLO_DOSIS = re.compile(r"\d")
+
+# Claves del registro original que se copian a cada componente
+CLAVES_COMPONENTES = ["Secuencia", "Documento", "Num_orden", "Item", "archivo_origen"]
+
+# Días por unidad de TTratamiento (se busca en este orden; sin unidad reconocida el número ya son días)
+DIAS_POR_UNIDAD = [("MES", 30), ("DIA", 1), ("SEMANA", 7), ("AÑO", 365), ("ANO", 365), ("ANUAL", 365)]
+
+# Listas por consulta que se arman con los campos numéricos de las entregas (como en csv_final_shrinked)
+LISTAS_CONSULTA = {
+    "cantidad_mg_lista": "cantidad_mg",
+    "frecuencia_hrs_lista": "frecuencia_hrs",
+    "unidades_dosis_lista": "unidades_dosis",
+    "dias_duracion_lista": "dias_duracion_tratamiento",
+}
+
+# Separadores candidatos al detectar el formato de un CSV, en orden de preferencia
+SEPARADORES_CANDIDATOS = [";", ",", "\t", "|"]
+
+# Formatos de la salida "dirty" y su extensión (None en main = no se genera)
+FORMATOS_DIRTY = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet", "feather": ".feather"}
+
+# Formatos del final particionado (se escribe además del CSV) y su formato en pyarrow.dataset
+FORMATOS_FINAL_PARTICIONADO = {"parquet": "parquet", "arrow": "ipc"}
+
+# Columnas del final particionado: las que se codifican como diccionario y las que definen las carpetas
+COLUMNAS_DICCIONARIO = ["Categorización", "archivo_origen", "Sexo"]
+COLUMNAS_PARTICION = ["Categorización", "archivo_origen"]
+
+# Máximo de filas por grupo de filas en el final particionado (en Parquet cada grupo lleva min/max por columna)
+FILAS_POR_GRUPO = 100_000
+
+# Columnas que se conservan en el output filtrado
+COLUMNAS_CONSERVAR = [
+    'Secuencia', 'Documento', 'Num_orden', 'Medicamento', 'Frecuencia',
+    'Dosis', 'TTratamiento', 'Cantidad', 'Item', 'Nom1Pac', 'Nom2Pac',
+    'Apell1Pac', 'Apell2Pac', 'Fechnac', 'Sexo', 'archivo_origen'
+]
+
+
+# Diccionario de mapeo de nombres de columnas
+MAPEO_COLUMNAS = {
+    # Documento
+    'Documento': ['documento', 'DOCUMENTO', 'NumeroDocumento', 'NroDocumento'],
+    # Medicamento
+    'Medicamento': ['medicamento', 'MEDICAMENTO', 'MedicamentoNombre', 'NombreMedicamento'],
+    # Datos del paciente
+    'Nom1Pac': ['Nom1PAc', 'nombre1', 'NOMBRE1', 'PrimerNombre'],
+    'Nom2Pac': ['nombre2', 'NOMBRE2', 'SegundoNombre'],
+    'Apell1Pac': ['apellido1', 'APELLIDO1', 'PrimerApellido'],
+    'Apell2Pac': ['apellido2', 'APELLIDO2', 'SegundoApellido'],
+    'Fechnac': ['fechnac', 'FECHANAC', 'FechaNacimiento', 'Fecha_Nacimiento'],
+    'Sexo': ['sexo', 'SEXO', 'Genero', 'Género'],
+    # Datos de tratamiento
+    'Secuencia': ['secuencia', 'SECUENCIA'],
+    'Num_orden': ['num_orden', 'NUM_ORDEN', 'Orden', 'orden'],
+    'Frecuencia': ['frecuencia', 'FRECUENCIA'],
+    'Dosis': ['dosis', 'DOSIS'],
+    'TTratamiento': ['ttratamiento', 'TTRATAMIENTO', 'Tratamiento', 'tratamiento'],
+    'Cantidad': ['cantidad', 'CANTIDAD'],
+    'Item': ['item', 'ITEM'],
+    'FechaOrden': ['fechaorden', 'FECHAORDEN', 'Fecha_Orden', 'fecha_orden']
+}
+
+# Diccionario inverso (variante -> nombre estándar) para facilitar el renombrado
+RENOMBRADO_COLUMNAS = {}
+for nombre_estandar, variantes in MAPEO_COLUMNAS.items():
+    for variante in variantes:
+        RENOMBRADO_COLUMNAS[variante] = nombre_estandar
+
+# Columnas que el pipeline necesita leer al proyectar (archivo_origen se agrega al cargar)
+COLUMNAS_NECESARIAS = [columna for columna in COLUMNAS_CONSERVAR if columna != "archivo_origen"]
+
+# Tipos compactos asignados al leer, por nombre estándar de columna
+# (los ids se leen como int64; si hay vacíos se usa Int64 y si hay valores no numéricos, texto)
+TIPOS_COLUMNAS = {
+    "Secuencia": "int64",
+    "Documento": "int64",
+    "Num_orden": "int64",
+    "Sexo": "category",
+    "Frecuencia": "category",
+    "Via": "category",
+    "Empresa": "category",
+    "Medicamento": "category",
+}
+
+
+def decodificar_como_latin1(error):
+    """Manejador de errores de decodificación: los bytes inválidos se leen como latin-1"""
+    return error.object[error.start:error.end].decode("latin-1"), error.end
+
+
+# Nombre del manejador anterior para encoding_errors: un archivo utf-8 con algún byte latin-1 suelto se lee
+# completo sin alterar el resto del texto
+ERRORES_RESPALDO_LATIN1 = "respaldo_latin1"
+codecs.register_error(ERRORES_RESPALDO_LATIN1, decodificar_como_latin1)
+
+
+def es_utf8(fragmento, cortado=False):
+    """True si el fragmento decodifica como utf-8 (con cortado, un carácter partido al final no es error)"""
+    try:
+        fragmento.decode("utf-8")
+        return True
+    except UnicodeDecodeError as e:
+        return cortado and e.start >= len(fragmento) - 3 and e.reason == "unexpected end of data"
+
+
+def encoding_despues_de_ascii(archivo, inicio, bytes_bloque=1024 * 1024):
+    """Encoding de un archivo cuyos primeros bytes (hasta inicio) son ASCII
+
+    Un prefijo ASCII no distingue utf-8 de latin-1, y una tilde tardía leída con el equivocado deja texto
+    alterado o detiene la lectura: se recorre el resto por bloques hasta el primer byte no ASCII y se decide
+    desde ahí. Si todo el archivo es ASCII, latin-1 (cualquiera de los dos lo decodifica igual)
+    """
+    with open(archivo, "rb") as f:
+        f.seek(inicio)
+        for bloque in iter(lambda: f.read(bytes_bloque), b""):
+            if not bloque.isascii():
+                # El primer byte no ASCII abre un carácter: se decodifica desde él hasta el final del bloque
+                # siguiente (si el archivo sigue, el último carácter puede quedar partido)
+                fragmento = bloque[re.search(rb"[\x80-\xff]", bloque).start():] + f.read(bytes_bloque)
+                return "utf-8" if es_utf8(fragmento, cortado=f.read(1) != b"") else "latin-1"
+    return "latin-1"
+
+
+def detectar_formato_csv(archivo, bytes_muestra=64 * 1024):
+    """Detecta encoding y separador a partir de una muestra de bytes del inicio del archivo
+
+    Si la muestra es ASCII, el encoding se decide con el primer byte no ASCII del resto del archivo
+    """
+    with open(archivo, "rb") as f:
+        muestra = f.read(bytes_muestra)
+
+    # Si la muestra quedó cortada, descartar la última línea (podría partir un carácter multibyte)
+    if len(muestra) == bytes_muestra and b"\n" in muestra:
+        muestra = muestra[:muestra.rindex(b"\n")]
+
+    # latin-1 nunca falla al decodificar, por eso utf-8 solo se elige cuando los bytes lo confirman
+    if muestra.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif muestra.isascii():
+        encoding = encoding_despues_de_ascii(archivo, len(muestra))
+    else:
+        encoding = "utf-8" if es_utf8(muestra) else "latin-1"
+
+    lineas = muestra.decode(encoding).splitlines()
+    if not lineas:
+        return None
+
+    # El separador es el candidato que más se repite en el encabezado (ante empates gana el primero)
+    conteos = {sep: lineas[0].count(sep) for sep in SEPARADORES_CANDIDATOS}
+    sep = max(SEPARADORES_CANDIDATOS, key=lambda candidato: conteos[candidato])
+    if conteos[sep] == 0:
+        return None
+    return encoding, sep
+
+
+def formato_de_archivo(archivo, formatos=None):
+    """Devuelve (encoding, separador, origen): el formato indicado en formatos o el detectado en el archivo"""
+    if formatos and archivo in formatos:
+        encoding, sep = formatos[archivo]
+        return encoding, sep, "indicado"
+    formato = detectar_formato_csv(archivo)
+    if formato is None:
+        return None
+    return formato[0], formato[1], "detectado"
+
+
+def leer_csv_compacto(archivo, encoding, sep, columnas=None, tipos=None):
+    """Lee un CSV solo con las columnas indicadas y tipos compactos; devuelve los nombres ya estandarizados
+
+    archivo puede ser una ruta o un buffer en memoria (se rebobina antes de cada lectura)
+    """
+    tipos = tipos or {}
+    en_memoria = hasattr(archivo, "seek")
+    encabezado = pd.read_csv(archivo, encoding=encoding, sep=sep, nrows=0).columns
+    usecols = [c for c in encabezado if columnas is None or RENOMBRADO_COLUMNAS.get(c, c) in columnas]
+    dtype = {c: tipos[RENOMBRADO_COLUMNAS.get(c, c)] for c in usecols if RENOMBRADO_COLUMNAS.get(c, c) in tipos}
+
+    enteros = [c for c, tipo in dtype.items() if tipo == "int64"]
+    alternativas = [dtype, {**dtype, **{c: "Int64" for c in enteros}}, {c: t for c, t in dtype.items() if c not in enteros}]
+    for intento, tipos_lectura in enumerate(alternativas):
+        if en_memoria:
+            archivo.seek(0)
+        try:
+            df = pd.read_csv(archivo, encoding=encoding, sep=sep, usecols=usecols, dtype=tipos_lectura)
+            break
+        except (ValueError, TypeError) as e:
+            # Errores de decodificación o de formato se propagan; aquí solo se atienden ids vacíos o no enteros
+            if isinstance(e, (UnicodeDecodeError, pd.errors.ParserError)) or intento == len(alternativas) - 1:
+                raise
+            print(f"Advertencia: {archivo} tiene ids vacíos o no enteros en {enteros}, se relee con un tipo más general")
+
+    return estandarizar_nombres_columnas(df, mostrar=False)
+
+
+def unificar_categorias(dfs):
+    """Iguala las categorías de cada columna categórica para que pd.concat conserve el tipo category"""
+    columnas = {c for df in dfs for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}
+    for columna in columnas:
+        presentes = [df for df in dfs if columna in df.columns]
+        if not all(isinstance(df[columna].dtype, pd.CategoricalDtype) for df in presentes):
+            continue
+        categorias = union_categoricals([df[columna] for df in presentes]).categories
+        for df in presentes:
+            df[columna] = df[columna].cat.set_categories(categorias)
+
+
+def firma_archivo(archivo):
+    """Tamaño, fecha de modificación y sha256 del contenido de un archivo"""
+    estado = os.stat(archivo)
+    sha256 = hashlib.sha256()
+    with open(archivo, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(bloque)
+    return {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns, "sha256": sha256.hexdigest()}
+
+
+def ruta_cache_entrada(directorio_cache, archivo, opciones):
+    """Ruta base (sin extensión) de la entrada de caché de un archivo leído con ciertas opciones"""
+    clave = json.dumps([os.path.abspath(archivo), opciones], sort_keys=True, default=str)
+    return os.path.join(directorio_cache, hashlib.sha256(clave.encode("utf-8")).hexdigest()[:24])
+
+
+def leer_cache_entrada(directorio_cache, archivo, opciones, firma):
+    """Devuelve el DataFrame guardado para el archivo si su firma coincide; None si no hay entrada válida"""
+    base = ruta_cache_entrada(directorio_cache, archivo, opciones)
+    if not (os.path.exists(base + ".json") and os.path.exists(base + ".feather")):
+        return None
+    with open(base + ".json", encoding="utf-8") as f:
+        metadatos = json.load(f)
+    if metadatos.get("firma") != firma:
+        return None
+    return pd.read_feather(base + ".feather")
+
+
+def guardar_cache_entrada(directorio_cache, archivo, opciones, firma, df):
+    """Guarda el DataFrame cargado de un archivo en formato Feather (Arrow IPC) junto con su firma
+
+    Si no se puede escribir, se advierte y el archivo queda sin caché (la carga no se interrumpe)
+    """
+    base = ruta_cache_entrada(directorio_cache, archivo, opciones)
+    # Arrow exige un tipo por columna: las columnas con valores mezclados (read_csv con low_memory las deja
+    # como object, p. ej. teléfonos numéricos y "SIN TEL") se guardan como texto
+    mezcladas = {columna: "str" for columna in df.columns if df[columna].dtype == object}
+    try:
+        os.makedirs(directorio_cache, exist_ok=True)
+        df.astype(mezcladas).to_feather(base + ".feather.tmp")
+    except (pyarrow.ArrowException, OSError) as e:
+        print(f"Advertencia: no se pudo guardar {archivo} en la caché columnar, se omite: {e}")
+        if os.path.exists(base + ".feather.tmp"):
+            os.remove(base + ".feather.tmp")
+        return
+    os.replace(base + ".feather.tmp", base + ".feather")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"archivo": os.path.abspath(archivo), "opciones": opciones, "firma": firma}, f,
+                  ensure_ascii=False, default=str)
+
+
+def cargar_y_combinar_datos(archivos, formatos=None, columnas=None, tipos=None, directorio_cache=None):
+    """Carga y combina todos los archivos CSV en un solo DataFrame
+
+    formatos: diccionario opcional {archivo: (encoding, separador)} que reemplaza la detección automática
+    columnas: nombres estándar de las columnas a leer (None = todas)
+    tipos: {nombre estándar: dtype} asignados al leer; con columnas o tipos cada archivo se estandariza
+    al cargarlo, para que las columnas categóricas sobrevivan a la combinación
+    directorio_cache: si se indica (y pyarrow está instalado), cada archivo cargado se guarda en Feather y
+    se reutiliza mientras su ruta, tamaño, fecha de modificación y contenido (sha256) no cambien
+    """
+    if directorio_cache and pyarrow is None:
+        print("Advertencia: pyarrow no está instalado, se omite la caché columnar de entradas")
+        directorio_cache = None
 
-
-def normalizar_texto(texto):
-    """Normaliza texto para comparaciones más robustas"""
-    if pd.isna(texto):
-        return ""
-    return str(texto).lower().strip()
-
-
-def cargar_y_combinar_datos(archivos):
-    """Carga y combina todos los archivos CSV en un solo DataFrame"""
     dfs = []
     for archivo in archivos:
         if os.path.exists(archivo):
-            encodings = ["latin-1", "ISO-8859-1", "utf-8"]
-            separadores = [";", ","]
-
-            cargado = False
-            for encoding in encodings:
-                if cargado:
-                    break
-                for sep in separadores:
-                    try:
-                        df = pd.read_csv(archivo, encoding=encoding, sep=sep)
-                        if len(df.columns) > 1:
-                            # Agregar columna para identificar el archivo de origen
-                            df['archivo_origen'] = os.path.basename(archivo)
-                            dfs.append(df)
-                            print(f"✓ {archivo} cargado con encoding {encoding} y separador '{sep}'")
-                            cargado = True
-                            break
-                    except (UnicodeDecodeError, pd.errors.ParserError):
-                        continue
-            if not cargado:
-                print(f"✗ No se pudo cargar {archivo} con ninguna combinación de encoding/separador")
+            if directorio_cache:
+                opciones = {
+                    "formato": (formatos or {}).get(archivo),
+                    "columnas": columnas,
+                    "tipos": tipos,
+                    "mapeo": MAPEO_COLUMNAS,
+                    "pandas": pd.__version__,
+                }
+                firma = firma_archivo(archivo)
+                df = leer_cache_entrada(directorio_cache, archivo, opciones, firma)
+                if df is not None:
+                    dfs.append(df)
+                    print(f"✓ {archivo} cargado desde la caché columnar ({len(df)} registros)")
+                    continue
+
+            formato = formato_de_archivo(archivo, formatos)
+            if formato is None:
+                print(f"✗ No se pudo detectar el encoding/separador de {archivo}")
+                continue
+            encoding, sep, origen = formato
+
+            compacto = columnas is not None or tipos is not None
+            try:
+                if compacto:
+                    df = leer_csv_compacto(archivo, encoding, sep, columnas, tipos)
+                else:
+                    df = pd.read_csv(archivo, encoding=encoding, sep=sep)
+            except UnicodeDecodeError:
+                # El archivo deja de ser utf-8 más allá de la muestra: latin-1 siempre decodifica
+                print(f"Advertencia: {archivo} no es {encoding} en su totalidad, se relee con latin-1")
+                encoding = "latin-1"
+                if compacto:
+                    df = leer_csv_compacto(archivo, encoding, sep, columnas, tipos)
+                else:
+                    df = pd.read_csv(archivo, encoding=encoding, sep=sep)
+            except pd.errors.ParserError as e:
+                print(f"✗ No se pudo cargar {archivo} con encoding {encoding} y separador '{sep}': {e}")
+                continue
+
+            # Agregar columna para identificar el archivo de origen
+            df['archivo_origen'] = os.path.basename(archivo)
+            dfs.append(df)
+            print(f"✓ {archivo} cargado con encoding {encoding} y separador '{sep}' ({origen})")
+            if directorio_cache:
+                guardar_cache_entrada(directorio_cache, archivo, opciones, firma, df)
         else:
             print(f"Advertencia: No se encontró el archivo {archivo}")
 
     if not dfs:
         raise Exception("No se pudieron cargar ninguno de los archivos")
 
+    unificar_categorias(dfs)
     return pd.concat(dfs, ignore_index=True)
 
 
-def estandarizar_nombres_columnas(df):
+def estandarizar_nombres_columnas(df, mostrar=True):
     """Estandariza los nombres de columnas para unificar los diferentes archivos"""
-    # Diccionario de mapeo de nombres de columnas
-    mapeo_columnas = {
-        # Documento
-        'Documento': ['documento', 'DOCUMENTO', 'NumeroDocumento', 'NroDocumento'],
-        # Medicamento
-        'Medicamento': ['medicamento', 'MEDICAMENTO', 'MedicamentoNombre', 'NombreMedicamento'],
-        # Datos del paciente
-        'Nom1Pac': ['Nom1PAc', 'nombre1', 'NOMBRE1', 'PrimerNombre'],
-        'Nom2Pac': ['nombre2', 'NOMBRE2', 'SegundoNombre'],
-        'Apell1Pac': ['apellido1', 'APELLIDO1', 'PrimerApellido'],
-        'Apell2Pac': ['apellido2', 'APELLIDO2', 'SegundoApellido'],
-        'Fechnac': ['fechnac', 'FECHANAC', 'FechaNacimiento', 'Fecha_Nacimiento'],
-        'Sexo': ['sexo', 'SEXO', 'Genero', 'Género'],
-        # Datos de tratamiento
-        'Secuencia': ['secuencia', 'SECUENCIA'],
-        'Num_orden': ['num_orden', 'NUM_ORDEN', 'Orden', 'orden'],
-        'Frecuencia': ['frecuencia', 'FRECUENCIA'],
-        'Dosis': ['dosis', 'DOSIS'],
-        'TTratamiento': ['ttratamiento', 'TTRATAMIENTO', 'Tratamiento', 'tratamiento'],
-        'Cantidad': ['cantidad', 'CANTIDAD'],
-        'Item': ['item', 'ITEM']
-    }
-
-    # Crear diccionario inverso para facilitar el renombrado
-    renombrado = {}
-    for nombre_estandar, variantes in mapeo_columnas.items():
-        for variante in variantes:
-            renombrado[variante] = nombre_estandar
-
     # Renombrar columnas
-    df_renombrado = df.rename(columns=renombrado)
-
-    print("Columnas después de estandarizar:", df_renombrado.columns.tolist())
+    df_renombrado = df.rename(columns=RENOMBRADO_COLUMNAS)
+
+    # Fusionar columnas que quedaron repetidas tras el renombrado (p. ej. 'Cantidad' y 'CANTIDAD'
+    # de archivos distintos), tomando el primer valor no nulo de cada registro
+    if df_renombrado.columns.duplicated().any():
+        columnas_fusionadas = {}
+        for nombre in pd.unique(df_renombrado.columns):
+            columna = df_renombrado[nombre]
+            if isinstance(columna, pd.DataFrame):
+                repetidas = columna
+                columna = repetidas.iloc[:, 0]
+                for posicion in range(1, repetidas.shape[1]):
+                    columna = columna.where(columna.notna(), repetidas.iloc[:, posicion])
+            columnas_fusionadas[nombre] = columna
+        df_renombrado = pd.DataFrame(columnas_fusionadas)
+
+    if mostrar:
+        print("Columnas después de estandarizar:", df_renombrado.columns.tolist())
     return df_renombrado
 
 
@@ -538,250 +886,51 @@ def identificar_columnas(df):
     return doc_col, med_col
 
 
-def buscar_medicamentos_exactos(texto_medicamento):
-    """Busca EXACTAMENTE los medicamentos de interés en el texto, evitando falsos positivos"""
-    texto = normalizar_texto(texto_medicamento)
-
-    # Diccionario de medicamentos con sus nombres EXACTOS y grupos
-    medicamentos_exactos = {
-        # GRUPO ESPECIAL
-        "metoprolol": "GE_metoprolol",
-        "propranolol": "GE_metoprolol",
-        "propanolol": "GE_metoprolol",
-        "hidroclorotiazida": "GE_hidroclorotiazida",
-        # ARA II
-        "irbesartan": "ARA_II",
-        "valsartan": "ARA_II",
-        "olmesartan": "ARA_II",
-        "telmisartan": "ARA_II",
-        "losartan": "ARA_II",
-        # IECA
-        "enalapril": "IECA",
-        "captopril": "IECA",
-        "perindopril": "IECA",
-        # Calcioantagonistas
-        "amlodipino": "Calcioantagonistas",
-        "nifedipino": "Calcioantagonistas",
-        "verapamilo": "Calcioantagonistas",
-        # Otros diuréticos
-        "espironolactona": "Otros_diuréticos",
-        "furosemida": "Otros_diuréticos",
-        "indapamida": "Otros_diuréticos",
-        "clortalidona": "Otros_diuréticos",
-        # Otros Beta-Bloqueadores
-        "bisoprolol": "Otros_Beta_Bloqueadores",
-        "carvedilol": "Otros_Beta_Bloqueadores",
-        "nebivolol": "Otros_Beta_Bloqueadores",
-        # Otros antihipertensivos
-        "minoxidil": "Otros_antihipertensivos",
-        "prazosina": "Otros_antihipertensivos",
-        "clonidina": "Otros_antihipertensivos",
-    }
-
-    grupos_encontrados = set()
-
-    # Buscar cada medicamento EXACTAMENTE en el texto
-    for medicamento, grupo in medicamentos_exactos.items():
-        # Usar regex para buscar la palabra completa, evitando subcadenas
-        if re.search(r"\b" + re.escape(medicamento) + r"\b", texto):
-            grupos_encontrados.add(grupo)
-
-    return list(grupos_encontrados)
-
-
-def tiene_medicamento_x(texto_medicamento, grupos_encontrados):
-    """Determina si hay medicamentos X adicionales de manera más inteligente"""
-    texto = normalizar_texto(texto_medicamento)
-
-    # Lista de palabras comunes en descripciones de medicamentos (NO son medicamentos X)
-    palabras_no_x = {
-        "mg", "mcg", "g", "ml", "l", "cc", "tableta", "tabletas", "comprimido", "comprimidos",
-        "capsula", "capsulas", "cápsula", "cápsulas", "gragea", "grageas", "inyección", "ampolla",
-        "frasco", "sobre", "suspension", "suspensión", "jarabe", "crema", "pomada", "supositorio",
-        "spray", "inhalador", "parche", "ungüento", "oral", "intramuscular", "intravenoso",
-        "subcutaneo", "subcutáneo", "topico", "tópico", "rectal", "vaginal", "oftalmico", "oftálmico",
-        "otico", "ótico", "nasal", "cada", "horas", "día", "dias", "semana", "semanas", "mes", "meses",
-        "año", "años", "dosis", "frecuencia", "tratamiento", "tomar", "aplicar", "uso", "adultos",
-        "niños", "pacientes", "administrar", "via", "cad", "diaria", "semanal", "mensual", "anual",
-        "continuo", "alternos", "mg", "mcg", "g", "ml", "l", "cc", "ui", "unidad", "unidades",
-        "por", "con", "sin", "de", "la", "el", "y", "o", "para", "entre", "hasta", "desde", "sobre",
-        "bajo", "tras", "durante", "antes", "después", "al", "del", "se", "es", "en", "a", "u", "un",
-        "una", "unos", "unas", "uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve",
-        "diez", "cien", "mil", "medio", "media", "cuarto", "cuarta", "primera", "segunda", "tercera",
-        "tartrato", "bloqueadores", "antihipertensivos", "diuréticos", "bloqueador", "antihipertensivo",
-        "diurético", "calcioantagonistas", "calcioantagonista", "hidroclorotiazida", "clorhidrato",
-        "maleato", "succinato", "besilato", "valsartan", "irbesartan", "telmisartan", "olmesartan",
-        "losartan", "enalapril", "captopril", "perindopril", "amlodipino", "nifedipino", "verapamilo",
-        "espironolactona", "furosemida", "indapamida", "clortalidona", "bisoprolol", "carvedilol",
-        "nebivolol", "minoxidil", "prazosina", "clonidina", "metoprolol", "propranolol", "propanolol",
-    }
-
-    # Remover los medicamentos encontrados
-    texto_limpio = texto
-    for grupo in grupos_encontrados:
-        medicamentos_grupo = {
-            "GE_metoprolol": ["metoprolol", "propranolol", "propanolol"],
-            "GE_hidroclorotiazida": ["hidroclorotiazida"],
-            "ARA_II": ["irbesartan", "valsartan", "olmesartan", "telmisartan", "losartan"],
-            "IECA": ["enalapril", "captopril", "perindopril"],
-            "Calcioantagonistas": ["amlodipino", "nifedipino", "verapamilo"],
-            "Otros_diuréticos": ["espironolactona", "furosemida", "indapamida", "clortalidona"],
-            "Otros_Beta_Bloqueadores": ["bisoprolol", "carvedilol", "nebivolol"],
-            "Otros_antihipertensivos": ["minoxidil", "prazosina", "clonidina"],
-        }
-
-        if grupo in medicamentos_grupo:
-            for med in medicamentos_grupo[grupo]:
-                texto_limpio = re.sub(r"\b" + re.escape(med) + r"\b", "", texto_limpio)
-
-    # Remover palabras no-X y números, buscar palabras de 4+ letras
-    palabras = re.findall(r"[a-zA-Z]{4,}", texto_limpio)  # Solo palabras de 4+ letras
-    palabras_filtradas = [p for p in palabras if p not in palabras_no_x]
-
-    # También verificar si hay signos de múltiples medicamentos (+, &, "y", "con")
-    tiene_multiples = bool(re.search(r"\+|\&| y | con |/\s*[a-zA-Z]", texto))
-
-    return len(palabras_filtradas) > 0 or tiene_multiples
-
-
-def determinar_categorizacion_por_registro(medicamento_str):
-    """Determina la categorización INDIVIDUAL para CADA REGISTRO - VERSIÓN MEJORADA"""
-    # Buscar grupos de medicamentos EXACTOS
-    grupos = buscar_medicamentos_exactos(medicamento_str)
-
-    # Si no hay medicamentos de interés, no procesar
-    if not grupos:
-        return "NO_APLICA"
-
-    # Determinar si hay medicamento X
-    hay_x = tiene_medicamento_x(medicamento_str, grupos)
-
-    # Mapeo de nombres internos a nombres de categorización
-    mapeo_categorias = {
-        "GE_metoprolol": "GE metoprolol",
-        "GE_hidroclorotiazida": "GE Hidroclorotiazida",
-        "ARA_II": "ARA II",
-        "IECA": "IECA",
-        "Calcioantagonistas": "Calcioantagonistas",
-        "Otros_diuréticos": "Otros diuréticos",
-        "Otros_Beta_Bloqueadores": "Otros Beta-Bloqueadores",
-        "Otros_antihipertensivos": "Otros Anti-Hipertensivos",
-    }
-
-    # Convertir grupos internos a nombres de categoría
-    grupos_categoria = [mapeo_categorias[grupo] for grupo in grupos]
-
-    # ORDEN JERÁRQUICO DE GRUPOS
-    orden_jerarquico = [
-        "GE metoprolol",
-        "GE Hidroclorotiazida",
-        "ARA II",
-        "IECA",
-        "Calcioantagonistas",
-        "Otros diuréticos",
-        "Otros Beta-Bloqueadores",
-        "Otros Anti-Hipertensivos"
-    ]
-
-    # Separar grupos especiales y ordenar todos los grupos por jerarquía
-    grupos_especiales = [g for g in grupos_categoria if g.startswith("GE ")]
-    grupos_no_especiales = [g for g in grupos_categoria if not g.startswith("GE ")]
+def contar_correcciones(serie_medicamentos, corrector, conteo=None):
+    """Acumula en un Counter cuántos registros tuvieron cada corrección (palabra, medicamento)"""
+    conteo = Counter() if conteo is None else conteo
+    for texto, registros in serie_medicamentos.value_counts().items():
+        for correccion in corrector.correcciones_en(texto):
+            conteo[correccion] += int(registros)
+    return conteo
 
-    # Ordenar grupos por jerarquía
-    grupos_ordenados = []
-    for grupo in orden_jerarquico:
-        if grupo in grupos_especiales or grupo in grupos_no_especiales:
-            grupos_ordenados.append(grupo)
 
-    # REGLAS DE CATEGORIZACIÓN MEJORADAS PARA MÚLTIPLES MEDICAMENTOS
+def reporte_correcciones(conteo):
+    """Lista de correcciones aplicadas, de la más a la menos frecuente"""
+    return [{"palabra": palabra, "medicamento": medicamento, "registros": registros}
+            for (palabra, medicamento), registros in conteo.most_common()]
 
-    # Caso 1: Solo un grupo de interés
-    if len(grupos_ordenados) == 1:
-        if hay_x:
-            return f"{grupos_ordenados[0]}-X univ"
-        else:
-            return f"{grupos_ordenados[0]} univ"
 
-    # Caso 2: Múltiples grupos de interés
-    else:
-        # Construir etiqueta base uniendo grupos ordenados
-        etiqueta_base = " && ".join(grupos_ordenados)
-
-        # Manejar grupos especiales en múltiples combinaciones
-        if any(g.startswith("GE ") for g in grupos_ordenados):
-            # Si hay GE, verificar combinaciones específicas
-            tiene_ge_metoprolol = "GE metoprolol" in grupos_ordenados
-            tiene_ge_hidro = "GE Hidroclorotiazida" in grupos_ordenados
-
-            # Remover "GE " de los nombres para construcción especial
-            grupos_sin_ge = [g.replace("GE ", "") for g in grupos_ordenados if g.startswith("GE ")]
-            grupos_no_ge = [g for g in grupos_ordenados if not g.startswith("GE ")]
-
-            if tiene_ge_metoprolol and tiene_ge_hidro:
-                # Caso GE Hidro-Meto con otros grupos
-                if grupos_no_ge:
-                    etiqueta_base = f"GE Hidro-Meto && {' && '.join(grupos_no_ge)}"
-                else:
-                    etiqueta_base = "GE Hidro-Meto"
-            elif tiene_ge_metoprolol:
-                # Caso GE Meto con otros grupos
-                if grupos_no_ge:
-                    etiqueta_base = f"GE Meto && {' && '.join(grupos_no_ge)}"
-                else:
-                    etiqueta_base = "GE Meto"
-            elif tiene_ge_hidro:
-                # Caso GE Hidro con otros grupos
-                if grupos_no_ge:
-                    etiqueta_base = f"GE Hidro && {' && '.join(grupos_no_ge)}"
-                else:
-                    etiqueta_base = "GE Hidro"
+ARREGLO_CATEGORIAS = np.array(TABLA_CATEGORIAS, dtype=object)
 
-        # Añadir X si existe
-        if hay_x:
-            return f"{etiqueta_base} - X"
-        else:
-            return etiqueta_base
 
-
-def es_registro_de_interes(medicamento_str):
-    """Determina si un registro contiene al menos un medicamento de interés"""
-    grupos = buscar_medicamentos_exactos(medicamento_str)
-    return len(grupos) > 0
-
-
-def procesar_csv_por_registro(df, doc_col, med_col):
+def procesar_csv_por_registro(df, doc_col, med_col, corrector=None, columnas=COLUMNAS_CONSERVAR):
     """Procesa CADA REGISTRO individualmente y genera el CSV de salida con columnas específicas"""
     registros_procesados = []
 
     print(f"Procesando {len(df)} registros individualmente...")
     registros_con_interes = 0
 
-    # Lista de columnas que queremos conservar en el output filtrado
-    columnas_conservar = [
-        'Secuencia', 'Documento', 'Num_orden', 'Medicamento', 'Frecuencia',
-        'Dosis', 'TTratamiento', 'Cantidad', 'Item', 'Nom1Pac', 'Nom2Pac',
-        'Apell1Pac', 'Apell2Pac', 'Fechnac', 'Sexo', 'archivo_origen'
-    ]
-
     for indice, fila in df.iterrows():
         medicamento = fila[med_col]
+        tokens = tokenizar_medicamento(medicamento, corrector)
 
         # SOLO procesar si el registro tiene medicamentos de interés
-        if es_registro_de_interes(medicamento):
+        if tokens.mascara:
             registros_con_interes += 1
 
             # Crear un nuevo registro solo con las columnas que nos interesan
             registro_procesado = {}
 
             # Copiar solo las columnas especificadas
-            for columna in columnas_conservar:
+            for columna in columnas:
                 if columna in fila:
                     registro_procesado[columna] = fila[columna]
                 else:
                     registro_procesado[columna] = None  # Si la columna no existe, poner None
 
-            # Asignar categorización INDIVIDUAL para este registro
-            categoria = determinar_categorizacion_por_registro(medicamento)
+            # Asignar categorización INDIVIDUAL para este registro (con la misma tokenización)
+            categoria = categoria_de_tokens(tokens)
             registro_procesado["Categorización"] = categoria
 
             registros_procesados.append(registro_procesado)
@@ -790,75 +939,1297 @@ def procesar_csv_por_registro(df, doc_col, med_col):
     return registros_procesados
 
 
-def main():
-    """Función principal"""
+def clasificar_columna(serie_medicamentos, corrector=None):
+    """Calcula la categorización de cada texto de la columna de medicamentos (índice 0..n-1)
+
+    Cada texto se tokeniza una sola vez; en la práctica se llama con los valores distintos de la columna
+    (ver CacheClasificacion), así que el recorrido en Python es sobre textos únicos
+    """
+    return pd.Series([categoria_de_tokens(tokenizar_medicamento(texto, corrector)) for texto in serie_medicamentos],
+                     dtype=object)
+
+
+def textos_distintos(serie_medicamentos):
+    """Textos distintos de la columna Medicamento (los nulos y no textuales se omiten: son NO_APLICA)"""
+    if isinstance(serie_medicamentos.dtype, pd.CategoricalDtype):
+        # Las categorías ya son los valores distintos
+        valores = serie_medicamentos.cat.categories
+    else:
+        valores = serie_medicamentos.unique()
+    return [valor for valor in valores if isinstance(valor, str)]
+
+
+def propagar_categorias(serie_medicamentos, categorias):
+    """Lleva las categorizaciones por texto ({texto: etiqueta}) a todos los registros de la columna"""
+    if isinstance(serie_medicamentos.dtype, pd.CategoricalDtype):
+        etiquetas = [categorias.get(valor, "NO_APLICA") for valor in serie_medicamentos.cat.categories]
+        etiquetas = np.array(etiquetas + ["NO_APLICA"], dtype=object)  # el código -1 (nulo) apunta al último
+        return pd.Series(etiquetas[serie_medicamentos.cat.codes.to_numpy()], index=serie_medicamentos.index)
+    resultado = serie_medicamentos.map(categorias).astype(object)
+    return resultado.where(resultado.notna(), "NO_APLICA")
+
+
+class CacheClasificacion(clasificador.CacheClasificacion):
+    """Caché de clasificación (ver clasificador.CacheClasificacion) que además clasifica columnas de pandas"""
+
+    def clasificar_serie(self, serie_medicamentos, nuevas=None):
+        """Clasifica cada valor distinto una sola vez y propaga el resultado a todos sus registros
+
+        nuevas: diccionario opcional donde se registran las clasificaciones calculadas en esta llamada
+        """
+        return propagar_categorias(serie_medicamentos,
+                                   self.categorias_de_textos(textos_distintos(serie_medicamentos), nuevas))
+
+
+def crear_pool(cache, workers):
+    """Crea el pool de procesos, sembrando la caché de cada trabajador con la caché principal"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=inicializar_trabajador,
+        initargs=(dict(cache.entradas), cache.tamano_maximo,
+                  cache.corrector.distancia_maxima if cache.corrector is not None else None),
+    )
+
+
+def integrar_resultado(cache, resultado):
+    """Incorpora a la caché principal lo aprendido por un trabajador y devuelve sus categorías por texto"""
+    categorias, nuevas, aciertos, fallos = resultado
+    for medicamento, categoria in nuevas.items():
+        cache.agregar(medicamento, categoria)
+    cache.aciertos += aciertos
+    cache.fallos += fallos
+    return categorias
+
+
+def clasificar_en_paralelo(serie_medicamentos, cache, workers):
+    """Reparte los textos distintos de la columna entre procesos y propaga sus categorías a todos los registros
+
+    A los procesos solo viajan listas de cadenas, así que no necesitan importar pandas
+    """
+    textos = textos_distintos(serie_medicamentos)
+    limites = np.linspace(0, len(textos), workers + 1).astype(int)
+    particiones = [textos[inicio:fin] for inicio, fin in zip(limites[:-1], limites[1:])]
+    categorias = {}
+    with crear_pool(cache, workers) as pool:
+        for resultado in pool.map(clasificar_particion, particiones):
+            categorias.update(integrar_resultado(cache, resultado))
+    return propagar_categorias(serie_medicamentos, categorias)
+
+
+def horas_de_frecuencia(texto_frecuencia):
+    """Frecuencia en horas (" Cada 12 HORAS" -> 12, "CADA DIARIA" -> 24), con los typos conocidos corregidos"""
+    texto = str(texto_frecuencia).upper().strip()
+    for patron, reemplazo in REEMPLAZOS_FRECUENCIA:
+        texto = patron.sub(reemplazo, texto)
+    texto = texto.strip()
+
+    for patron in PATRONES_HORAS:
+        coincidencia = patron.search(texto)
+        if coincidencia:
+            return int(float(coincidencia.group(1)))
+    if PATRON_CADA_DIARIA.search(texto):
+        return 24
+    coincidencia = PATRON_CADA_NUMERO.search(texto)
+    if coincidencia:
+        return int(float(coincidencia.group(1)))
+    for palabra, horas in HORAS_POR_PALABRA.items():
+        if palabra in texto:
+            return horas
+    if "HORA" in texto and "CADA" in texto:
+        return 1
+    if "UNICA" in texto:
+        return None
+
+    # Último recurso: el primer número del texto se toma como horas
+    coincidencia = PATRON_NUMERO.search(texto)
+    return int(float(coincidencia.group(1))) if coincidencia else None
+
+
+def unidades_de_dosis(texto_dosis):
+    """Primer número de la dosis ("1  Tabletas" -> 1.0)"""
+    coincidencia = PATRON_NUMERO.search(str(texto_dosis).strip())
+    return float(coincidencia.group(1)) if coincidencia else None
+
+
+def dias_de_tratamiento(texto_tratamiento):
+    """Duración del tratamiento en días ("3 MES(ES)" -> 90.0, "30 DIA(S)" -> 30.0)"""
+    texto = str(texto_tratamiento).strip().upper()
+    coincidencia = PATRON_NUMERO.search(texto)
+    if not coincidencia:
+        return None
+    numero = float(coincidencia.group(1))
+    for unidad, dias in DIAS_POR_UNIDAD:
+        if unidad in texto:
+            return numero * dias
+    return numero
+
+
+def cantidad_mg_de_medicamento(texto_medicamento):
+    """Primera dosis en mg escrita en el texto del medicamento ("CARVEDILOL 625 MG" -> 625.0)"""
+    texto = str(texto_medicamento)
+    for patron in PATRONES_MG:
+        coincidencia = patron.search(texto)
+        if coincidencia:
+            return float(coincidencia.group(1))
+    return None
+
+
+# Columnas numéricas derivadas: nombre -> (columna de origen, extractor por valor)
+CAMPOS_NUMERICOS = {
+    "cantidad_mg": ("Medicamento", cantidad_mg_de_medicamento),
+    "frecuencia_hrs": ("Frecuencia", horas_de_frecuencia),
+    "unidades_dosis": ("Dosis", unidades_de_dosis),
+    "dias_duracion_tratamiento": ("TTratamiento", dias_de_tratamiento),
+}
+
+
+def aplicar_por_valor(serie, extractor):
+    """Evalúa el extractor una sola vez por valor distinto y propaga el resultado a todas las filas (float64)"""
+    codigos, valores = pd.factorize(serie)
+    # El código -1 (nulo) apunta al None agregado al final, que queda como NaN
+    resultados = np.array([extractor(valor) for valor in valores] + [None], dtype=float)
+    return pd.Series(resultados[codigos], index=serie.index)
+
+
+def extraer_campos_numericos(df):
+    """cantidad_mg, frecuencia_hrs, unidades_dosis y dias_duracion_tratamiento de un DataFrame de registros
+
+    Estas columnas tienen muy pocos valores distintos, así que cada texto se interpreta una sola vez; si falta
+    la columna de origen, el campo queda vacío (NaN)
+    """
+    return pd.DataFrame({
+        campo: (aplicar_por_valor(df[origen], extractor) if origen in df.columns
+                else pd.Series(np.nan, index=df.index))
+        for campo, (origen, extractor) in CAMPOS_NUMERICOS.items()
+    }, index=df.index)
+
+
+def componentes_de_medicamento(texto_medicamento, corrector=None):
+    """Componentes de un texto de Medicamento: lista de (texto, principio activo del catálogo o None, mg)
+
+    Si el texto trae tantas dosis en mg como componentes ("LOSARTAN + HIDROCLOROTIAZIDA 50 MG + 12.5 MG"),
+    se asignan en orden; si no, cada componente toma la primera dosis escrita en su propio trozo. El
+    principio activo se reconoce como en la clasificación (con el corrector de typos, si se pasa)
+    """
+    texto = str(texto_medicamento).strip()
+    if not texto:
+        return []
+    partes = [parte.strip() for parte in PATRON_SEPARADOR_COMPONENTES.split(texto)]
+    ingredientes = [parte for parte in partes if parte and not PATRON_SOLO_DOSIS.match(parte)] or [texto]
+
+    if len(ingredientes) == 1:
+        cantidades = [cantidad_mg_de_medicamento(texto)]
+    else:
+        patron_mg = next((patron for patron in PATRONES_MG if patron.search(texto)), PATRONES_MG[0])
+        dosis = patron_mg.findall(texto)
+        if len(dosis) == len(ingredientes):
+            # Las dosis van aparte de los nombres: se quitan de cada componente para no atribuírselas
+            cantidades = [float(valor) for valor in dosis]
+            ingredientes = [patron_mg.sub("", parte).strip(" /") or parte for parte in ingredientes]
+        else:
+            cantidades = [cantidad_mg_de_medicamento(parte) for parte in ingredientes]
+
+    componentes = []
+    for parte, cantidad in zip(ingredientes, cantidades):
+        medicamentos = medicamentos_de_texto(parte, corrector)
+        componentes.append((parte, medicamentos[0].upper() if medicamentos else None, cantidad))
+    return componentes
+
+
+def explotar_componentes(df, med_col="Medicamento", claves=CLAVES_COMPONENTES, corrector=None):
+    """Una fila por componente (principio activo) de cada registro, con las claves del registro original
+
+    Cada texto distinto se separa una sola vez; las filas se generan con índices de NumPy (np.repeat) sin
+    recorrer los registros. Columnas: claves presentes, componente (1, 2, ...), Medicamento_componente,
+    principio_activo y cantidad_mg. Los registros sin Medicamento no generan filas. corrector: el de la
+    clasificación, para que los registros clasificados por una corrección tengan su principio activo
+    """
+    if isinstance(df[med_col].dtype, pd.CategoricalDtype):
+        codigos, valores = df[med_col].cat.codes.to_numpy(), df[med_col].cat.categories
+    else:
+        codigos, valores = pd.factorize(df[med_col])
+
+    # Componentes de cada texto distinto, aplanados: el texto k ocupa las posiciones inicio[k]:inicio[k + 1]
+    por_texto = [componentes_de_medicamento(valor, corrector) for valor in valores]
+    cantidad = np.array([len(componentes) for componentes in por_texto] + [0], dtype=np.int64)
+    inicio = np.concatenate([[0], np.cumsum(cantidad[:-1])])
+    planos = [componente for componentes in por_texto for componente in componentes]
+    textos_codigos, textos = pd.factorize(pd.Series([texto for texto, _, _ in planos], dtype=object))
+    activos_codigos, activos = pd.factorize(pd.Series([activo for _, activo, _ in planos], dtype=object))
+    mg = np.array([cantidad_mg for _, _, cantidad_mg in planos], dtype=float)
+
+    # El código -1 (nulo) apunta al último elemento de cantidad, que vale 0: esos registros no generan filas
+    repeticiones = cantidad[codigos]
+    filas = np.repeat(np.arange(len(df)), repeticiones)
+    desplazamiento = np.arange(len(filas)) - np.repeat(np.cumsum(repeticiones) - repeticiones, repeticiones)
+    posiciones = np.repeat(inicio[codigos], repeticiones) + desplazamiento
+
+    resultado = df[[columna for columna in claves if columna in df.columns]].take(filas).reset_index(drop=True)
+    resultado["componente"] = desplazamiento + 1
+    resultado["Medicamento_componente"] = pd.Categorical.from_codes(textos_codigos[posiciones], textos)
+    resultado["principio_activo"] = pd.Categorical.from_codes(activos_codigos[posiciones], activos)
+    resultado["cantidad_mg"] = mg[posiciones]
+    return resultado
+
+
+def convertir_fechas(serie):
+    """Convierte fechas d/m/a (con o sin hora) a datetime64, evaluando cada texto distinto una sola vez
+
+    Los textos que no encajan en ningún formato de FORMATOS_FECHA (p. ej. "00:00.0") quedan como NaT
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return pd.Series(serie.to_numpy(), index=serie.index)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Las categorías ya son los valores distintos
+        codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, valores = pd.factorize(serie)
+    textos = pd.Series(valores, dtype=object).astype(str).str.strip()
+    fechas = pd.Series(pd.NaT, index=textos.index, dtype="datetime64[ns]")
+    for formato in FORMATOS_FECHA:
+        pendientes = fechas.isna()
+        if not pendientes.any():
+            break
+        fechas[pendientes] = pd.to_datetime(textos[pendientes], format=formato, errors="coerce")
+    # El código -1 (nulo) apunta al NaT agregado al final
+    return pd.Series(np.append(fechas.to_numpy(), np.datetime64("NaT", "ns"))[codigos], index=serie.index)
+
+
+def normalizar_fechas(df, columnas=COLUMNAS_FECHA):
+    """Convierte las columnas de fecha presentes a datetime64 y cuenta los valores inválidos de cada una
+
+    Devuelve (copia del DataFrame, {columna: valores no vacíos que quedaron como NaT})
+    """
+    df = df.copy()
+    invalidas = {}
+    for columna in columnas:
+        if columna not in df.columns:
+            continue
+        fechas = convertir_fechas(df[columna])
+        invalidas[columna] = int((df[columna].notna() & fechas.isna()).sum())
+        df[columna] = fechas
+    return df, invalidas
+
+
+def aaaammdd(fechas):
+    """Fechas como enteros aaaammdd (y máscara de NaT), calculados una vez por fecha distinta"""
+    codigos, unicas = pd.factorize(fechas)
+    dias = np.asarray(unicas, dtype="datetime64[ns]").astype("datetime64[D]")
+    anios = dias.astype("datetime64[Y]")
+    meses = dias.astype("datetime64[M]")
+    numero = ((anios.astype(np.int64) + 1970) * 10000 + (meses.astype(np.int64) % 12 + 1) * 100
+              + (dias - meses).astype(np.int64) + 1)
+    # El código -1 (NaT) toma el valor agregado al final y queda marcado en la máscara
+    return np.append(numero, 0)[codigos], codigos < 0
+
+
+def calcular_edad(fecha_nacimiento, fecha_referencia):
+    """Edad cumplida en años a la fecha de referencia (NA si falta una fecha o la referencia es anterior)"""
+    # La diferencia de aaaammdd dividida por 10000 descuenta un año solo si no ha pasado el cumpleaños
+    nacimiento, sin_nacimiento = aaaammdd(fecha_nacimiento)
+    referencia, sin_referencia = aaaammdd(fecha_referencia)
+    edad = (referencia - nacimiento) // 10000
+    faltante = sin_nacimiento | sin_referencia | (edad < 0)
+    return pd.Series(pd.arrays.IntegerArray(np.where(faltante, 0, edad), faltante), index=fecha_nacimiento.index)
+
+
+def agregar_edad(df_final):
+    """Normaliza Fechnac y FechaOrden y agrega la edad del paciente a la fecha de la orden
+
+    Los conteos de fechas inválidas quedan en df_final.attrs["fechas_invalidas"]
+    """
+    df_final, invalidas = normalizar_fechas(df_final)
+    df_final["edad"] = calcular_edad(df_final["Fechnac"], df_final["FechaOrden"])
+    df_final.attrs["fechas_invalidas"] = invalidas
+    return df_final
+
+
+def seleccionar_registros_de_interes(df, categorias, campos_numericos=False, fechas=False):
+    """Conserva las columnas de salida de los registros de interés y agrega su categorización
+
+    campos_numericos: agregar también cantidad_mg, frecuencia_hrs, unidades_dosis y dias_duracion_tratamiento
+    fechas: conservar FechaOrden, convertir las fechas a datetime64 y agregar la edad (ver agregar_edad)
+    """
+    interes = (categorias != "NO_APLICA").to_numpy()
+
+    # Selección de columnas en lugar de copiar cada fila a un diccionario
+    df_final = df.loc[interes].reindex(columns=COLUMNAS_CONSERVAR + (["FechaOrden"] if fechas else []))
+    if campos_numericos:
+        df_final = pd.concat([df_final, extraer_campos_numericos(df_final)], axis=1)
+    if fechas:
+        df_final = agregar_edad(df_final)
+    df_final["Categorización"] = categorias[interes].to_numpy()
+    return df_final.reset_index(drop=True)
+
+
+def procesar_csv_columnar(df, doc_col, med_col, cache=None, mostrar=True, workers=1, campos_numericos=False,
+                          fechas=False):
+    """Procesa la columna de medicamentos completa de una vez (mismo resultado que procesar_csv_por_registro)"""
+    if mostrar:
+        print(f"Procesando {len(df)} registros en modo columnar...")
+
+    # Deduplicar y luego propagar: cada texto distinto de Medicamento se clasifica una sola vez
+    if cache is None:
+        cache = CacheClasificacion()
+    if workers > 1:
+        categorias = clasificar_en_paralelo(df[med_col], cache, workers)
+    else:
+        categorias = cache.clasificar_serie(df[med_col])
+
+    df_final = seleccionar_registros_de_interes(df, categorias, campos_numericos, fechas)
+    if mostrar:
+        print(f"Registros con medicamentos de interés: {len(df_final)}")
+    return df_final
+
+
+def leer_csv_por_bloques(archivo, encoding, sep, usecols, tamano_bloque):
+    """Genera los bloques (como texto) de un CSV
+
+    Si un bloque deja de decodificar con el encoding detectado, el archivo se relee leyendo como latin-1 solo
+    los bytes inválidos (el resto sigue en el encoding detectado) y se entregan los registros siguientes a
+    los ya entregados. Se cuentan registros del mismo parser, no líneas: un campo entre comillas con saltos
+    de línea o una línea vacía no corren el punto de reanudación
+    """
+    nombres = pd.read_csv(archivo, encoding=encoding, sep=sep, nrows=0).columns.tolist()
+    errores = "strict"
+    entregadas = 0
+    while True:
+        leidas = 0
+        try:
+            for bloque in pd.read_csv(archivo, encoding=encoding, encoding_errors=errores, sep=sep, header=0,
+                                      names=nombres, usecols=usecols, dtype=str, chunksize=tamano_bloque):
+                leidas += len(bloque)
+                if leidas <= entregadas:
+                    continue
+                if leidas - entregadas < len(bloque):
+                    bloque = bloque.iloc[len(bloque) - (leidas - entregadas):].copy()
+                yield bloque
+                entregadas = leidas
+            return
+        except UnicodeDecodeError:
+            if errores != "strict":
+                raise
+            print(f"Advertencia: {archivo} no es {encoding} después del registro {entregadas}, se relee desde ahí "
+                  f"con los bytes inválidos como latin-1")
+            errores = ERRORES_RESPALDO_LATIN1
+
+
+def procesar_en_streaming(archivos, archivo_salida_dirty, archivo_salida, tamano_bloque=100_000, cache=None,
+                          workers=1, formatos=None, columnas=None, metricas=None, correcciones=None,
+                          campos_numericos=False, fechas=False, formato_final=None, componentes=False):
+    """Lee cada archivo por bloques, los estandariza y clasifica, y agrega cada bloque a las salidas
+
+    La memoria queda acotada por el tamaño de bloque: solo se acumulan los conteos de los resúmenes.
+    Los valores se leen como texto, por lo que se escriben tal como vienen en el archivo de origen.
+    Con workers > 1 los bloques se clasifican en un pool de procesos (como máximo 2 por trabajador
+    en vuelo) y se escriben en el orden de lectura. archivo_salida_dirty puede ser None (no se genera)
+    o terminar en .gz (CSV comprimido). Si se pasa el diccionario metricas, se anotan en él las filas
+    leídas y las escritas en el final. Si la caché tiene corrector de typos y se pasa el Counter
+    correcciones, se acumulan en él las correcciones de cada bloque; con fechas, las fechas inválidas
+    de todos los bloques quedan en metricas["fechas_invalidas"]. Con formato_final ("parquet" o "arrow")
+    cada bloque del final se agrega además al dataset particionado junto al CSV final, y con componentes
+    sus componentes (explotar_componentes) al CSV de componentes.
+    """
+    if cache is None:
+        cache = CacheClasificacion()
+
+    # Formato y encabezado de cada archivo: las columnas del "dirty" son la unión en orden de aparición
+    lecturas = {}
+    columnas_crudas = []
+    for archivo in archivos:
+        if not os.path.exists(archivo):
+            print(f"Advertencia: No se encontró el archivo {archivo}")
+            continue
+        formato = formato_de_archivo(archivo, formatos)
+        if formato is None:
+            print(f"✗ No se pudo detectar el encoding/separador de {archivo}")
+            continue
+        encoding, sep, origen = formato
+        print(f"✓ {archivo} se leerá por bloques de {tamano_bloque} con encoding {encoding} y separador '{sep}' ({origen})")
+        encabezado = pd.read_csv(archivo, encoding=encoding, sep=sep, nrows=0).columns.tolist()
+        if columnas is not None:
+            encabezado = [c for c in encabezado if RENOMBRADO_COLUMNAS.get(c, c) in columnas]
+        lecturas[archivo] = (encoding, sep, encabezado)
+        for columna in encabezado + ["archivo_origen"]:
+            if columna not in columnas_crudas:
+                columnas_crudas.append(columna)
+
+    if not lecturas:
+        raise Exception("No se pudieron cargar ninguno de los archivos")
+
+    columnas_dirty = list(pd.unique(pd.Index(columnas_crudas).map(lambda c: RENOMBRADO_COLUMNAS.get(c, c))))
+    doc_col, med_col = identificar_columnas(pd.DataFrame(columns=columnas_dirty))
+
+    conteo_categorias = Counter()
+    conteo_origen = Counter()
+    totales = {"leidos": 0, "final": 0, "segundos_dirty": 0.0, "bloques": 0}
+    fechas_invalidas = Counter()
+    if formato_final is not None:
+        shutil.rmtree(ruta_final_particionado(archivo_salida), ignore_errors=True)
+    pool = crear_pool(cache, workers) if workers > 1 else None
+    en_vuelo = deque()
+
+    if archivo_salida_dirty is None:
+        contexto_dirty = contextlib.nullcontext()
+    elif archivo_salida_dirty.endswith(".gz"):
+        contexto_dirty = gzip.open(archivo_salida_dirty, "wt", encoding="utf-8-sig", newline="")
+    else:
+        contexto_dirty = open(archivo_salida_dirty, "w", encoding="utf-8-sig", newline="")
+    contexto_componentes = contextlib.nullcontext()
+    if componentes:
+        contexto_componentes = open(ruta_componentes(archivo_salida), "w", encoding="utf-8-sig", newline="")
+
+    with contexto_dirty as salida_dirty, contexto_componentes as salida_componentes, \
+            open(archivo_salida, "w", encoding="utf-8-sig", newline="") as salida_final:
+
+        def escribir_bloque(archivo, bloque, categorias):
+            """Agrega un bloque ya clasificado a las salidas y actualiza los resúmenes"""
+            primer_bloque = totales["leidos"] == 0
+            if salida_dirty is not None:
+                inicio = time.perf_counter()
+                bloque.to_csv(salida_dirty, index=False, sep=";", header=primer_bloque)
+                totales["segundos_dirty"] += time.perf_counter() - inicio
+            df_final = seleccionar_registros_de_interes(bloque, categorias, campos_numericos, fechas)
+            df_final.to_csv(salida_final, index=False, sep=";", header=primer_bloque)
+            if salida_componentes is not None:
+                explotar_componentes(df_final, corrector=cache.corrector).to_csv(salida_componentes, index=False,
+                                                                                 sep=";", header=primer_bloque)
+            if formato_final is not None:
+                escribir_final_particionado(df_final, ruta_final_particionado(archivo_salida), formato_final,
+                                            parte=f"bloque{totales['bloques']:05d}")
+            totales["bloques"] += 1
+            fechas_invalidas.update(df_final.attrs.get("fechas_invalidas", {}))
+
+            totales["leidos"] += len(bloque)
+            totales["final"] += len(df_final)
+            conteo_categorias.update(df_final["Categorización"].value_counts().to_dict())
+            conteo_origen.update(df_final["archivo_origen"].value_counts().to_dict())
+            print(f"  {archivo}: {totales['leidos']} registros leídos, {totales['final']} con medicamentos de interés")
+
+        def escribir_mas_antiguo():
+            """Espera el bloque más antiguo en vuelo y lo escribe (conserva el orden de lectura)"""
+            archivo, bloque, futuro = en_vuelo.popleft()
+            categorias = integrar_resultado(cache, futuro.result())
+            escribir_bloque(archivo, bloque, propagar_categorias(bloque[med_col], categorias))
+
+        try:
+            for archivo, (encoding, sep, usecols) in lecturas.items():
+                for bloque in leer_csv_por_bloques(archivo, encoding, sep, usecols, tamano_bloque):
+                    bloque["archivo_origen"] = os.path.basename(archivo)
+                    bloque = estandarizar_nombres_columnas(bloque, mostrar=False).reindex(columns=columnas_dirty)
+                    if cache.corrector is not None and correcciones is not None:
+                        contar_correcciones(bloque[med_col], cache.corrector, correcciones)
+
+                    if pool is None:
+                        escribir_bloque(archivo, bloque, cache.clasificar_serie(bloque[med_col]))
+                        continue
+
+                    futuro = pool.submit(clasificar_particion, textos_distintos(bloque[med_col]))
+                    en_vuelo.append((archivo, bloque, futuro))
+                    if len(en_vuelo) >= 2 * workers:
+                        escribir_mas_antiguo()
+
+            while en_vuelo:
+                escribir_mas_antiguo()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    if archivo_salida_dirty is not None:
+        print(f"✓ Archivo 'dirty' generado: {archivo_salida_dirty} ({totales['segundos_dirty']:.2f} s de escritura)")
+    if metricas is not None:
+        metricas.update({"filas_entrada": totales["leidos"], "filas_salida": totales["final"]})
+        if fechas:
+            metricas["fechas_invalidas"] = dict(fechas_invalidas)
+    return totales["final"], conteo_categorias, conteo_origen
+
+
+def escribir_dirty(df, ruta, formato):
+    """Escribe el DataFrame combinado en el formato indicado y devuelve los segundos que tomó"""
+    inicio = time.perf_counter()
+    if formato in ("parquet", "feather"):
+        # Arrow exige un tipo por columna: las columnas con valores mezclados se guardan como texto
+        mezcladas = {columna: "str" for columna in df.columns if df[columna].dtype == object}
+        df = df.astype(mezcladas)
+        if formato == "parquet":
+            df.to_parquet(ruta + ".tmp", index=False)
+        else:
+            df.to_feather(ruta + ".tmp")
+        os.replace(ruta + ".tmp", ruta)
+    else:
+        compresion = "gzip" if formato == "csv.gz" else None
+        df.to_csv(ruta, index=False, encoding="utf-8-sig", sep=";", compression=compresion)
+    return time.perf_counter() - inicio
+
+
+def iniciar_escritura_dirty(df, ruta, formato):
+    """Escribe el "dirty" en un hilo aparte para solaparlo con la clasificación; devuelve (escritor, futuro)
+
+    df no debe modificarse hasta que termine la escritura (la clasificación solo lo lee)
+    """
+    escritor = ThreadPoolExecutor(max_workers=1)
+    return escritor, escritor.submit(escribir_dirty, df, ruta, formato)
+
+
+def ruta_componentes(archivo_salida):
+    """CSV de componentes (una fila por principio activo), junto al CSV final"""
+    return os.path.splitext(archivo_salida)[0] + "_componentes.csv"
+
+
+def ruta_final_particionado(archivo_salida):
+    """Carpeta del final particionado, junto al CSV final"""
+    return os.path.splitext(archivo_salida)[0]
+
+
+def escribir_final_particionado(df_final, directorio, formato="parquet", parte=None):
+    """Escribe el final como dataset de pyarrow particionado por Categorización y archivo_origen
+
+    Las carpetas siguen el esquema Hive (Categorización=.../archivo_origen=...), de modo que una lectura
+    filtrada por categoría o archivo solo abre esos archivos. Categorización, archivo_origen y Sexo se
+    codifican como diccionario de texto con índices int32 en todas las partes, así que un bloque con más
+    valores distintos que los anteriores se puede agregar sin cambiar el tipo. parte=None reemplaza el
+    dataset completo; con un nombre de parte se agregan archivos a los existentes (bloques y modo
+    incremental). Devuelve los segundos que tomó
+    """
+    inicio = time.perf_counter()
+    if parte is None:
+        shutil.rmtree(directorio, ignore_errors=True)
+        parte = "parte"
+    if df_final.empty:
+        return time.perf_counter() - inicio
+
+    # Arrow exige un tipo por columna: las columnas con valores mezclados se guardan como texto
+    tipos = {columna: "str" for columna in df_final.columns if df_final[columna].dtype == object}
+    tipos.update({columna: "category" for columna in COLUMNAS_DICCIONARIO if columna in df_final.columns})
+    tabla = pyarrow.Table.from_pandas(df_final.astype(tipos), preserve_index=False)
+    # pandas elige el ancho del índice según las categorías del bloque (int8 hasta 127): se fija uno solo
+    tipo_diccionario = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    for columna in COLUMNAS_DICCIONARIO:
+        if columna in tabla.column_names:
+            tabla = tabla.set_column(tabla.schema.get_field_index(columna), pyarrow.field(columna, tipo_diccionario),
+                                     tabla[columna].cast(tipo_diccionario))
+    if os.path.isdir(directorio) and os.listdir(directorio):
+        # Al agregar archivos se conservan los tipos de los ya escritos (p. ej. Cantidad que allí quedó como texto)
+        existente = pyarrow.dataset.dataset(directorio, format=FORMATOS_FINAL_PARTICIONADO[formato]).schema
+        for campo in existente:
+            if campo.name in tabla.column_names and tabla.schema.field(campo.name).type != campo.type:
+                tabla = tabla.set_column(tabla.schema.get_field_index(campo.name), campo,
+                                         tabla[campo.name].cast(campo.type))
+
+    opciones_archivo = None
+    if formato == "parquet":
+        opciones_archivo = pyarrow.dataset.ParquetFileFormat().make_write_options(write_statistics=True)
+    pyarrow.dataset.write_dataset(
+        tabla, directorio, format=FORMATOS_FINAL_PARTICIONADO[formato],
+        partitioning=pyarrow.dataset.partitioning(tabla.select(COLUMNAS_PARTICION).schema, flavor="hive"),
+        basename_template=f"{parte}-{{i}}.{formato}", existing_data_behavior="overwrite_or_ignore",
+        file_options=opciones_archivo, max_rows_per_group=FILAS_POR_GRUPO,
+    )
+    return time.perf_counter() - inicio
+
+
+def leer_final_particionado(directorio, formato="parquet", categorias=None, archivos_origen=None, columnas=None):
+    """Lee el final particionado, opcionalmente solo algunas categorías, archivos de origen y columnas
+
+    Los filtros sobre las columnas de partición descartan carpetas completas sin abrirlas
+    """
+    dataset = pyarrow.dataset.dataset(directorio, format=FORMATOS_FINAL_PARTICIONADO[formato],
+                                      partitioning=pyarrow.dataset.HivePartitioning.discover(infer_dictionary=True))
+    filtro = None
+    for columna, valores in (("Categorización", categorias), ("archivo_origen", archivos_origen)):
+        if valores is not None:
+            condicion = pyarrow.dataset.field(columna).isin(list(valores))
+            filtro = condicion if filtro is None else filtro & condicion
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+
+
+def mostrar_resumen(archivo_salida_dirty, archivo_salida, total, categorias_count, origen_count):
+    """Muestra el resumen de categorizaciones y la distribución por archivo de origen"""
+    print(f"\n=== PROCESO COMPLETADO CON ÉXITO ===")
+    print(f"Archivo 'dirty' (completo): {archivo_salida_dirty or 'no generado'}")
+    print(f"Archivo filtrado generado: {archivo_salida}")
+    print(f"Total de registros procesados: {total}")
+
+    # Mostrar resumen de categorizaciones
+    print(f"\nResumen de categorizaciones POR REGISTRO:")
+    for categoria, count in categorias_count.items():
+        print(f"  {categoria}: {count} registros")
+
+    print(f"\nTotal de categorías únicas: {len(categorias_count)}")
+
+    # Mostrar distribución por archivo de origen
+    if origen_count is not None:
+        print(f"\nDistribución por archivo de origen:")
+        for origen, count in origen_count.items():
+            print(f"  {origen}: {count} registros")
+
+
+def ruta_manifiesto(archivo_salida):
+    """Manifiesto del modo incremental, junto al CSV final"""
+    return os.path.splitext(archivo_salida)[0] + ".manifest.json"
+
+
+def estado_archivo_fuente(archivo, formatos=None):
+    """Tamaño, sha256, largo del encabezado y formato de un archivo de entrada, para el manifiesto"""
+    formato = formato_de_archivo(archivo, formatos)
+    sha256 = hashlib.sha256()
+    with open(archivo, "rb") as f:
+        fin_encabezado = len(f.readline())
+        f.seek(0)
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(bloque)
+    return {
+        "tamano": os.path.getsize(archivo),
+        "sha256": sha256.hexdigest(),
+        "fin_encabezado": fin_encabezado,
+        "encoding": formato[0] if formato else None,
+        "sep": formato[1] if formato else None,
+    }
+
+
+def marcas_de_agua(df):
+    """Secuencia máxima ya procesada de cada archivo de origen"""
+    secuencias = pd.to_numeric(df["Secuencia"], errors="coerce")
+    return {archivo: (None if pd.isna(maximo) else int(maximo))
+            for archivo, maximo in secuencias.groupby(df["archivo_origen"], observed=True).max().items()}
+
+
+def guardar_manifiesto(archivo_salida, opciones, estados, df_dirty):
+    """Guarda el manifiesto de una ejecución completa: estado de cada entrada, marca de agua y columnas del dirty"""
+    marcas = marcas_de_agua(df_dirty) if "Secuencia" in df_dirty.columns else {}
+    manifiesto = {
+        "huella_catalogo": huella_catalogo(),
+        "opciones": opciones,
+        "columnas_dirty": list(df_dirty.columns),
+        "tipos_dirty": {columna: str(tipo) for columna, tipo in df_dirty.dtypes.items()},
+        "archivos": {
+            archivo: {**estado, "marca_de_agua": marcas.get(os.path.basename(archivo))}
+            for archivo, estado in estados.items()
+        },
+    }
+    ruta = ruta_manifiesto(archivo_salida)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(ruta + ".tmp", ruta)
+    print(f"✓ Manifiesto incremental guardado: {ruta}")
+
+
+def leer_cola_archivo(archivo, estado):
+    """Compara el prefijo ya procesado con el manifiesto y devuelve (nuevo estado, bytes agregados)
+
+    Devuelve (None, motivo) si el archivo fue reescrito en lugar de ampliado
+    """
+    tamano_anterior = estado["tamano"]
+    if os.path.getsize(archivo) < tamano_anterior:
+        return None, "es más pequeño que en la ejecución anterior"
+
+    sha256 = hashlib.sha256()
+    with open(archivo, "rb") as f:
+        encabezado = f.read(estado["fin_encabezado"])
+        sha256.update(encabezado)
+        restante = tamano_anterior - len(encabezado)
+        while restante > 0:
+            bloque = f.read(min(restante, 1024 * 1024))
+            if not bloque:
+                break
+            sha256.update(bloque)
+            restante -= len(bloque)
+        if sha256.hexdigest() != estado["sha256"]:
+            return None, "cambió su contenido ya procesado"
+        cola = f.read()
+
+    sha256.update(cola)
+    nuevo_estado = {**estado, "tamano": tamano_anterior + len(cola), "sha256": sha256.hexdigest()}
+    return nuevo_estado, encabezado + cola if cola.strip() else b""
+
+
+def procesar_incremental(archivos, archivo_salida_dirty, archivo_salida, opciones, cache=None, workers=1):
+    """Clasifica solo las filas agregadas al final de cada archivo desde la última ejecución
+
+    Las filas nuevas se anexan a los CSV dirty y final (y al final particionado, si está en las opciones)
+    y se actualiza el manifiesto. Devuelve False (sin
+    escribir nada) cuando hace falta una reconstrucción completa: sin manifiesto o salidas, catálogo u
+    opciones distintos, archivos nuevos o reescritos, o filas nuevas con Secuencia menor a la marca de agua
+    """
+    ruta = ruta_manifiesto(archivo_salida)
+    if archivo_salida_dirty is not None and not archivo_salida_dirty.endswith((".csv", ".csv.gz")):
+        print("Modo incremental: el 'dirty' en formato columnar no admite anexar registros")
+        return False
+    salidas = [ruta, archivo_salida] + ([archivo_salida_dirty] if archivo_salida_dirty is not None else [])
+    if opciones.get("formato_final") is not None:
+        salidas.append(ruta_final_particionado(archivo_salida))
+    if opciones.get("componentes"):
+        salidas.append(ruta_componentes(archivo_salida))
+    if not all(os.path.exists(salida) for salida in salidas):
+        print("Modo incremental: no hay manifiesto o salidas previas")
+        return False
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Modo incremental: manifiesto ilegible ({e})")
+        return False
+    if manifiesto.get("huella_catalogo") != huella_catalogo() or manifiesto.get("opciones") != opciones:
+        print("Modo incremental: cambió el catálogo de medicamentos o las opciones de lectura")
+        return False
+    if set(manifiesto["archivos"]) != {archivo for archivo in archivos if os.path.exists(archivo)}:
+        print("Modo incremental: cambió el conjunto de archivos de entrada")
+        return False
+
+    # Validar todos los archivos antes de escribir, para no dejar las salidas a medio actualizar
+    estados = {}
+    dfs = []
+    for archivo, estado in manifiesto["archivos"].items():
+        nuevo_estado, cola = leer_cola_archivo(archivo, estado)
+        if nuevo_estado is None:
+            print(f"Modo incremental: {archivo} {cola}")
+            return False
+        estados[archivo] = nuevo_estado
+        if not cola:
+            continue
+
+        try:
+            df = leer_csv_compacto(io.BytesIO(cola), estado["encoding"], estado["sep"],
+                                   opciones["columnas"], TIPOS_COLUMNAS)
+        except UnicodeDecodeError:
+            df = leer_csv_compacto(io.BytesIO(cola), "latin-1", estado["sep"], opciones["columnas"], TIPOS_COLUMNAS)
+        df["archivo_origen"] = os.path.basename(archivo)
+
+        marca = estado["marca_de_agua"]
+        if marca is not None and (pd.to_numeric(df["Secuencia"], errors="coerce") < marca).any():
+            print(f"Modo incremental: {archivo} tiene filas nuevas con Secuencia menor a {marca}")
+            return False
+        nueva_marca = pd.to_numeric(df["Secuencia"], errors="coerce").max()
+        if not pd.isna(nueva_marca):
+            estados[archivo]["marca_de_agua"] = int(nueva_marca)
+        dfs.append(df)
+        print(f"✓ {archivo}: {len(df)} registros nuevos después de Secuencia {marca}")
+
+    if dfs:
+        unificar_categorias(dfs)
+        df_nuevo = pd.concat(dfs, ignore_index=True).reindex(columns=manifiesto["columnas_dirty"])
+        # Mismo formato que la ejecución completa (p. ej. enteros que allí quedaron como float por faltantes)
+        flotantes = {columna: tipo for columna, tipo in manifiesto["tipos_dirty"].items()
+                     if tipo == "float64" and pd.api.types.is_numeric_dtype(df_nuevo[columna])}
+        df_nuevo = df_nuevo.astype(flotantes)
+
+        doc_col, med_col = identificar_columnas(df_nuevo)
+        df_final = procesar_csv_columnar(df_nuevo, doc_col, med_col, cache=cache, mostrar=False, workers=workers,
+                                         campos_numericos=opciones.get("campos_numericos", False),
+                                         fechas=opciones.get("fechas", False))
+        if archivo_salida_dirty is not None:
+            compresion = "gzip" if archivo_salida_dirty.endswith(".gz") else None
+            df_nuevo.to_csv(archivo_salida_dirty, mode="a", header=False, index=False, encoding="utf-8", sep=";",
+                            compression=compresion)
+        if not df_final.empty:
+            df_final.to_csv(archivo_salida, mode="a", header=False, index=False, encoding="utf-8", sep=";")
+            if opciones.get("componentes"):
+                corrector = cache.corrector if cache is not None else None
+                explotar_componentes(df_final, corrector=corrector).to_csv(
+                    ruta_componentes(archivo_salida), mode="a", header=False, index=False, encoding="utf-8", sep=";")
+            formato_final = opciones.get("formato_final")
+            if formato_final is not None:
+                escribir_final_particionado(df_final, ruta_final_particionado(archivo_salida), formato_final,
+                                            parte=f"incremental-{datetime.now():%Y%m%d%H%M%S%f}")
+        print(f"✓ {len(df_nuevo)} registros nuevos, {len(df_final)} agregados a {archivo_salida}")
+        if not df_final.empty:
+            print(df_final["Categorización"].value_counts().to_string())
+    else:
+        print("Modo incremental: no hay registros nuevos")
+
+    manifiesto["archivos"] = estados
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(ruta + ".tmp", ruta)
+    return True
+
+
+def nombre_entrega(texto_medicamento, corrector=None):
+    """Nombre de un medicamento entregado: los del catálogo que aparecen en el texto, en mayúsculas"""
+    texto = normalizar_texto(texto_medicamento)
+    if corrector is None:
+        medicamentos = dict.fromkeys(PATRON_MEDICAMENTOS.findall(texto))
+    else:
+        # Mismo criterio que la clasificación: sin tildes y con las palabras corregidas en su lugar
+        texto = plegar_acentos(texto)
+        medicamentos = dict.fromkeys(filter(None, (medicamento or (palabra and corrector.corregir(palabra))
+                                                   for medicamento, palabra, _ in PATRON_TOKENS.findall(texto))))
+    return " + ".join(medicamento.upper() for medicamento in medicamentos) or texto.upper()
+
+
+def claves_paciente_dia(codigos, fechas, dia_minimo, amplitud):
+    """Clave entera (paciente, día) que ordena primero por paciente y luego por fecha"""
+    dias = fechas.to_numpy().astype("datetime64[D]").astype(np.int64) - dia_minimo
+    return codigos.astype(np.int64) * amplitud + dias
+
+
+def unir_consultas_entregas(df_consultas, df_entregas, col_paciente="id_paciente", col_fecha_consulta="fecha_consulta",
+                            col_documento="Documento", col_fecha_orden="FechaOrden", med_col="Medicamento",
+                            columnas_lista=None, cache=None):
+    """Agrega a cada consulta las entregas de medicamentos de interés del paciente hasta su siguiente consulta
+
+    Cada entrega se asigna a la última consulta del mismo paciente con fecha menor o igual a la de la orden
+    (ventana [consulta, siguiente consulta)); las entregas anteriores a la primera consulta se descartan.
+    Ambos lados se ordenan por (paciente, día) y se cruzan con una búsqueda binaria; luego las listas se
+    arman en una sola pasada sobre las entregas ordenadas por consulta. Si df_entregas no trae
+    "Categorización", se clasifica con la caché (y su corrector de typos, si lo tiene). columnas_lista:
+    {columna de salida: columna de entregas} adicionales que se agregan como listas; por omisión, las de
+    LISTAS_CONSULTA presentes en df_entregas (campos numéricos). Devuelve una copia de df_consultas con
+    medicamentos_periodo, num_entregas_medicamentos, fechas_entregas, categorizacion_lista,
+    medicamentos_unicos y tiene_consulta_siguiente
+    """
+    if columnas_lista is None:
+        columnas_lista = {salida: columna for salida, columna in LISTAS_CONSULTA.items()
+                          if columna in df_entregas.columns}
+    cache = cache or CacheClasificacion()
+    if "Categorización" in df_entregas.columns:
+        categorias = df_entregas["Categorización"]
+    else:
+        categorias = cache.clasificar_serie(df_entregas[med_col])
+    interes = (categorias != "NO_APLICA").to_numpy()
+    entregas = df_entregas.loc[interes]
+    categorias = categorias.to_numpy()[interes]
+
+    # Mismos códigos de paciente en ambos lados (los documentos pueden venir como número o como texto)
+    pacientes_consulta = df_consultas[col_paciente]
+    pacientes_entrega = entregas[col_documento]
+    if pacientes_consulta.dtype != pacientes_entrega.dtype:
+        pacientes_consulta = pacientes_consulta.astype(str)
+        pacientes_entrega = pacientes_entrega.astype(str)
+    codigos, _ = pd.factorize(pd.concat([pacientes_consulta, pacientes_entrega], ignore_index=True))
+    codigos_consulta, codigos_entrega = codigos[:len(df_consultas)], codigos[len(df_consultas):]
+
+    fechas_consulta = convertir_fechas(df_consultas[col_fecha_consulta])
+    fechas_entrega = convertir_fechas(entregas[col_fecha_orden])
+    validas_consulta = np.flatnonzero(fechas_consulta.notna().to_numpy() & (codigos_consulta >= 0))
+    validas_entrega = np.flatnonzero(fechas_entrega.notna().to_numpy() & (codigos_entrega >= 0))
+
+    # Días relativos al mínimo de ambos lados; la amplitud separa a un paciente del siguiente en la clave
+    todas = pd.concat([fechas_consulta.iloc[validas_consulta], fechas_entrega.iloc[validas_entrega]])
+    dia_minimo = todas.min().to_datetime64().astype("datetime64[D]").astype(np.int64) if len(todas) else 0
+    amplitud = (todas.max().to_datetime64().astype("datetime64[D]").astype(np.int64) - dia_minimo + 1
+                if len(todas) else 1)
+
+    claves_consulta = claves_paciente_dia(codigos_consulta[validas_consulta],
+                                          fechas_consulta.iloc[validas_consulta], dia_minimo, amplitud)
+    orden_consulta = np.argsort(claves_consulta, kind="stable")
+    claves_consulta = claves_consulta[orden_consulta]
+    filas_consulta = validas_consulta[orden_consulta]
+    pacientes_ordenados = codigos_consulta[filas_consulta]
+
+    siguiente = np.zeros(len(df_consultas), dtype=bool)
+    siguiente[filas_consulta[:-1]] = pacientes_ordenados[1:] == pacientes_ordenados[:-1]
+
+    # As-of: la consulta con la mayor clave <= clave de la entrega, si es del mismo paciente
+    claves_entrega = claves_paciente_dia(codigos_entrega[validas_entrega],
+                                         fechas_entrega.iloc[validas_entrega], dia_minimo, amplitud)
+    posiciones = np.searchsorted(claves_consulta, claves_entrega, side="right") - 1
+    asignadas = posiciones >= 0
+    asignadas[asignadas] = pacientes_ordenados[posiciones[asignadas]] == codigos_entrega[validas_entrega][asignadas]
+    filas_entrega = validas_entrega[asignadas]
+    consulta_de_entrega = filas_consulta[posiciones[asignadas]]
+
+    # Entregas agrupadas por consulta y, dentro de cada una, por fecha (a igual fecha, en el orden original)
+    orden = np.lexsort((fechas_entrega.to_numpy()[filas_entrega], consulta_de_entrega))
+    filas_entrega = filas_entrega[orden]
+    consulta_de_entrega = consulta_de_entrega[orden]
+    inicios = np.r_[0, np.flatnonzero(np.diff(consulta_de_entrega)) + 1] if len(filas_entrega) else np.array([], int)
+    consultas_con_entregas = consulta_de_entrega[inicios]
+    limites = list(zip(inicios.tolist(), np.r_[inicios[1:], len(filas_entrega)].tolist()))
+
+    # Nombre de cada texto de Medicamento distinto, calculado una sola vez
+    codigos_medicamento, textos = pd.factorize(entregas[med_col].to_numpy()[filas_entrega])
+    nombres = np.array([nombre_entrega(texto, cache.corrector) for texto in textos] + [""],
+                       dtype=object)[codigos_medicamento]
+
+    def por_consulta(valores, agregar, vacio):
+        """Aplica agregar a los valores de cada consulta; las consultas sin entregas reciben vacio"""
+        resultado = np.full(len(df_consultas), vacio, dtype=object)
+        valores = valores.tolist()
+        resultado[consultas_con_entregas] = [agregar(valores[inicio:fin]) for inicio, fin in limites]
+        return resultado
+
+    resultado = df_consultas.copy()
+    resultado["medicamentos_periodo"] = por_consulta(nombres, " | ".join, "")
+    resultado["num_entregas_medicamentos"] = np.bincount(consulta_de_entrega, minlength=len(df_consultas))
+    fechas_objeto = fechas_entrega.iloc[filas_entrega].astype(object).to_numpy()
+    resultado["fechas_entregas"] = por_consulta(fechas_objeto, list, None)
+    for columna_salida, columna in columnas_lista.items():
+        resultado[columna_salida] = por_consulta(entregas[columna].to_numpy()[filas_entrega], list, None)
+    resultado["categorizacion_lista"] = por_consulta(categorias[filas_entrega],
+                                                     lambda trozo: " | ".join(dict.fromkeys(trozo)), "")
+    resultado["medicamentos_unicos"] = por_consulta(nombres, lambda trozo: len(set(trozo)), 0).astype(np.int64)
+    resultado["tiene_consulta_siguiente"] = siguiente
+    return resultado
+
+
+def rss_actual_mb():
+    """Memoria residente actual del proceso en MiB (pico histórico si no hay /proc)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MonitorMemoria:
+    """Muestrea la memoria residente en un hilo mientras dura el bloque with y guarda el pico"""
+
+    def __init__(self, intervalo=0.01):
+        self.intervalo = intervalo
+        self.pico_mb = 0.0
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self):
+        while not self._detener.is_set():
+            self.pico_mb = max(self.pico_mb, rss_actual_mb())
+            self._detener.wait(self.intervalo)
+
+    def __enter__(self):
+        self.pico_mb = rss_actual_mb()
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *excepcion):
+        self._detener.set()
+        self._hilo.join()
+        self.pico_mb = max(self.pico_mb, rss_actual_mb())
+
+
+class RegistroEtapas:
+    """Tiempo, filas de entrada y salida, filas/s y pico de memoria de cada etapa de una ejecución
+
+    Las etapas listadas en perfilar se ejecutan bajo un perfilador (pyinstrument si está instalado,
+    si no cProfile) y el perfil se guarda con el prefijo prefijo_perfiles. Solo se perfila el proceso
+    principal: con workers > 1 la clasificación ocurre en otros procesos.
+    """
+
+    def __init__(self, perfilar=(), prefijo_perfiles="perfil"):
+        self.etapas = []
+        self.perfilar = set(perfilar)
+        self.prefijo_perfiles = prefijo_perfiles
+        self.inicio = datetime.now()
+
+    @contextlib.contextmanager
+    def etapa(self, nombre, filas_entrada=None):
+        """Mide el bloque with; el bloque completa metricas["filas_salida"] (y filas_entrada si no se conocía)"""
+        metricas = {"etapa": nombre, "filas_entrada": filas_entrada, "filas_salida": None}
+        perfilador = self.iniciar_perfil() if nombre in self.perfilar else None
+        monitor = MonitorMemoria()
+        inicio = time.perf_counter()
+        try:
+            with monitor:
+                yield metricas
+        except Exception as e:
+            metricas["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            if perfilador is not None:
+                metricas["perfil"] = self.guardar_perfil(perfilador, nombre)
+            self.agregar(metricas, segundos, round(monitor.pico_mb, 1))
+
+    def agregar(self, metricas, segundos, rss_pico_mb=None):
+        """Registra una etapa medida fuera de etapa() (p. ej. la escritura en segundo plano)"""
+        filas = metricas.get("filas_entrada")
+        metricas.update({
+            "segundos": round(segundos, 3),
+            "filas_por_segundo": round(filas / segundos, 1) if filas and segundos > 0 else None,
+            "rss_pico_mb": rss_pico_mb,
+        })
+        self.etapas.append(metricas)
+
+    def iniciar_perfil(self):
+        """Arranca el perfilador de una etapa"""
+        if pyinstrument is not None:
+            perfilador = pyinstrument.Profiler()
+        else:
+            perfilador = cProfile.Profile()
+        if isinstance(perfilador, cProfile.Profile):
+            perfilador.enable()
+        else:
+            perfilador.start()
+        return perfilador
+
+    def guardar_perfil(self, perfilador, nombre):
+        """Detiene el perfilador y guarda el perfil (.txt de pyinstrument o .prof para pstats/snakeviz)"""
+        if isinstance(perfilador, cProfile.Profile):
+            perfilador.disable()
+            ruta = f"{self.prefijo_perfiles}_{nombre}.prof"
+            perfilador.dump_stats(ruta)
+        else:
+            perfilador.stop()
+            ruta = f"{self.prefijo_perfiles}_{nombre}.txt"
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write(perfilador.output_text())
+        print(f"✓ Perfil de la etapa '{nombre}' guardado en {ruta}")
+        return ruta
+
+    def resumen(self):
+        """Tabla legible de las etapas registradas"""
+        lineas = [f"{'Etapa':<24} {'segundos':>9} {'entrada':>10} {'salida':>10} {'filas/s':>12} {'MiB pico':>9}"]
+        for m in self.etapas:
+            lineas.append(f"{m['etapa']:<24} {m['segundos']:>9.2f} {m['filas_entrada'] or '':>10} "
+                          f"{m['filas_salida'] if m['filas_salida'] is not None else '':>10} "
+                          f"{m['filas_por_segundo'] or '':>12} {m['rss_pico_mb'] or '':>9}")
+        return "\n".join(lineas)
+
+    def guardar(self, ruta, **datos):
+        """Escribe el reporte JSON de la ejecución (etapas, datos adicionales, versiones y memoria pico)"""
+        fin = datetime.now()
+        reporte = {
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "fin": fin.isoformat(timespec="seconds"),
+            "segundos": round((fin - self.inicio).total_seconds(), 3),
+            **datos,
+            "etapas": self.etapas,
+            "rss_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "versiones": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__},
+        }
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(ruta + ".tmp", ruta)
+        print(f"✓ Reporte de ejecución guardado: {ruta}")
+
+
+def main(modo="columnar", ruta_cache=None, tamano_bloque=None, workers=1, formatos=None, proyectar_columnas=False,
+         directorio_cache_entradas=None, incremental=False, formato_dirty="csv",
+         ruta_reporte="registros_clasificados_por_medicamento_reporte.json", perfilar=False, correccion_typos=False,
+         campos_numericos=False, fechas=False, formato_final=None, componentes=False):
+    """Función principal (modo: "columnar" o "por_registro", la implementación de referencia fila a fila)
+
+    ruta_cache: archivo JSON opcional para reutilizar las clasificaciones entre ejecuciones (modo columnar)
+    tamano_bloque: si se indica, procesa los archivos por bloques de ese número de filas (memoria acotada)
+    workers: número de procesos para clasificar en paralelo; la salida es idéntica a la de un solo proceso
+    formatos: {archivo: (encoding, separador)} para omitir la detección automática en esos archivos
+    proyectar_columnas: leer solo las columnas que usa el pipeline (el archivo "dirty" tendrá solo esas columnas)
+    directorio_cache_entradas: carpeta de la caché columnar (Feather) de los archivos ya cargados y estandarizados
+    incremental: clasificar solo las filas agregadas desde la última ejecución (según el manifiesto junto al CSV
+    final) y anexarlas a las salidas; si algún archivo fue reescrito se reconstruye todo con la carga completa
+    formato_dirty: "csv", "csv.gz", "parquet", "feather" o None (no generar el "dirty"); en la carga completa
+    se escribe en un hilo aparte mientras se clasifica
+    ruta_reporte: JSON con tiempo, filas, filas/s y memoria pico de cada etapa (None = no se escribe)
+    perfilar: True perfila la etapa de clasificación; también acepta una lista de nombres de etapas
+    correccion_typos: reconocer medicamentos mal escritos o con tildes ("metroprolol", "losartán") con el
+    CorrectorMedicamentos; las correcciones aplicadas y su frecuencia se muestran y van al reporte
+    campos_numericos: agregar al CSV final cantidad_mg, frecuencia_hrs, unidades_dosis y
+    dias_duracion_tratamiento, interpretados de Medicamento, Frecuencia, Dosis y TTratamiento
+    fechas: escribir Fechnac y FechaOrden como fechas (aaaa-mm-dd; las inválidas quedan vacías y se cuentan)
+    y agregar la edad del paciente a la fecha de la orden
+    formato_final: "parquet" o "arrow" para escribir además del CSV final un dataset particionado por
+    Categorización y archivo_origen (carpeta registros_clasificados_por_medicamento_final/), que se puede
+    leer filtrado con leer_final_particionado
+    componentes: escribir además registros_clasificados_por_medicamento_final_componentes.csv, con una fila por
+    componente de cada registro del final ("LOSARTAN + HIDROCLOROTIAZIDA" -> 2 filas), sus claves y cantidad_mg
+    """
+    if formato_dirty is not None and formato_dirty not in FORMATOS_DIRTY:
+        raise ValueError(f"formato_dirty debe ser None o uno de {list(FORMATOS_DIRTY)}")
+    if formato_final is not None and formato_final not in FORMATOS_FINAL_PARTICIONADO:
+        raise ValueError(f"formato_final debe ser None o uno de {list(FORMATOS_FINAL_PARTICIONADO)}")
+    if formato_final is not None and pyarrow is None:
+        print("Advertencia: pyarrow no está instalado, se omite el final particionado")
+        formato_final = None
+    if formato_dirty in ("parquet", "feather") and pyarrow is None:
+        print(f"Advertencia: pyarrow no está instalado, el 'dirty' se escribe como csv.gz en lugar de {formato_dirty}")
+        formato_dirty = "csv.gz"
+    if formato_dirty in ("parquet", "feather") and tamano_bloque and not incremental:
+        print("Advertencia: el modo por bloques escribe el 'dirty' como csv.gz")
+        formato_dirty = "csv.gz"
+
     archivos = [
         "full_size/Antihipertensivos1.csv",
         "full_size/Antihipertensivos2.csv",
         "full_size/OtrosMedicamentos.csv",
     ]
 
+    archivo_salida_dirty = None
+    if formato_dirty is not None:
+        archivo_salida_dirty = "registros_clasificados_por_medicamento_dirty" + FORMATOS_DIRTY[formato_dirty]
+    archivo_salida = "registros_clasificados_por_medicamento_final.csv"
+    columnas = COLUMNAS_NECESARIAS if proyectar_columnas else None
+    opciones = {"columnas": columnas, "formatos": {archivo: list(formato) for archivo, formato in (formatos or {}).items()},
+                "formato_dirty": formato_dirty}
+    corrector = CorrectorMedicamentos() if correccion_typos else None
+    correcciones = Counter()
+    if corrector is not None:
+        opciones["correccion_typos"] = corrector.parametros()
+    if campos_numericos:
+        opciones["campos_numericos"] = True
+    if fechas:
+        opciones["fechas"] = True
+    if formato_final is not None:
+        opciones["formato_final"] = formato_final
+    if componentes:
+        opciones["componentes"] = True
+    fechas_invalidas = None
+
+    registro = RegistroEtapas(perfilar=("clasificacion",) if perfilar is True else (perfilar or ()))
+    cache = None
+    resultado = {"estado": "ok"}
+
     try:
+        if incremental:
+            cache = CacheClasificacion(ruta=ruta_cache, corrector=corrector)
+            with registro.etapa("incremental"):
+                aplicado = procesar_incremental(archivos, archivo_salida_dirty, archivo_salida, opciones, cache, workers)
+            if aplicado:
+                resultado["incremental"] = "anexado"
+                if ruta_cache:
+                    cache.guardar()
+                return
+            resultado["incremental"] = "reconstruccion"
+            print("Reconstrucción completa de las salidas...")
+            with registro.etapa("firma_entradas"):
+                estados = {archivo: estado_archivo_fuente(archivo, formatos) for archivo in archivos
+                           if os.path.exists(archivo)}
+
+        if tamano_bloque and not incremental:
+            print("Procesando datos por bloques desde CSV...")
+            cache = CacheClasificacion(ruta=ruta_cache, corrector=corrector)
+            with registro.etapa("procesamiento_por_bloques") as etapa:
+                total, categorias_count, origen_count = procesar_en_streaming(
+                    archivos, archivo_salida_dirty, archivo_salida, tamano_bloque, cache, workers, formatos, columnas,
+                    metricas=etapa, correcciones=correcciones, campos_numericos=campos_numericos, fechas=fechas,
+                    formato_final=formato_final, componentes=componentes
+                )
+                fechas_invalidas = etapa.get("fechas_invalidas")
+            print(f"Caché de clasificación: {cache.estadisticas()}")
+            if ruta_cache:
+                cache.guardar()
+            if total:
+                mostrar_resumen(archivo_salida_dirty, archivo_salida, total,
+                                dict(categorias_count.most_common()), dict(origen_count.most_common()))
+            else:
+                print("No se encontraron registros con medicamentos de interés")
+            return
+
         print("Cargando y combinando datos desde CSV...")
-        df_completo = cargar_y_combinar_datos(archivos)
+        with registro.etapa("carga") as etapa:
+            df_completo = cargar_y_combinar_datos(archivos, formatos, columnas, TIPOS_COLUMNAS,
+                                                  directorio_cache_entradas)
+            etapa["filas_entrada"] = etapa["filas_salida"] = len(df_completo)
 
         print("\nEstandarizando nombres de columnas...")
-        df_completo = estandarizar_nombres_columnas(df_completo)
+        with registro.etapa("estandarizacion", len(df_completo)) as etapa:
+            df_completo = estandarizar_nombres_columnas(df_completo)
+            etapa["filas_salida"] = len(df_completo)
 
         print("\nIdentificando columnas...")
         doc_col, med_col = identificar_columnas(df_completo)
 
-        # Guardar el CSV "dirty" (completo) antes de filtrar columnas
-        archivo_salida_dirty = "registros_clasificados_por_medicamento_dirty.csv"
-        df_completo.to_csv(archivo_salida_dirty, index=False, encoding="utf-8-sig", sep=";")
-        print(f"✓ Archivo 'dirty' generado: {archivo_salida_dirty}")
-
-        print("Procesando registros INDIVIDUALMENTE...")
-        registros_finales = procesar_csv_por_registro(df_completo, doc_col, med_col)
+        # Guardar el "dirty" (completo) en segundo plano mientras se clasifica
+        escritor = None
+        if archivo_salida_dirty is not None:
+            escritor, escritura_dirty = iniciar_escritura_dirty(df_completo, archivo_salida_dirty, formato_dirty)
+
+        with registro.etapa("clasificacion", len(df_completo)) as etapa:
+            if modo == "por_registro":
+                print("Procesando registros INDIVIDUALMENTE...")
+                registros_finales = procesar_csv_por_registro(
+                    df_completo, doc_col, med_col, corrector,
+                    COLUMNAS_CONSERVAR + (["FechaOrden"] if fechas else [])
+                )
+                df_final = pd.DataFrame(registros_finales)
+                if campos_numericos and not df_final.empty:
+                    df_final = pd.concat([df_final, extraer_campos_numericos(df_final)], axis=1)
+                if fechas and not df_final.empty:
+                    df_final = agregar_edad(df_final)
+            else:
+                cache = CacheClasificacion(ruta=ruta_cache, corrector=corrector)
+                df_final = procesar_csv_columnar(df_completo, doc_col, med_col, cache=cache, workers=workers,
+                                                 campos_numericos=campos_numericos, fechas=fechas)
+            etapa["filas_salida"] = len(df_final)
+            if fechas:
+                fechas_invalidas = etapa["fechas_invalidas"] = df_final.attrs.get("fechas_invalidas", {})
+            if corrector is not None:
+                contar_correcciones(df_completo[med_col], corrector, correcciones)
+        if cache is not None:
+            print(f"Caché de clasificación: {cache.estadisticas()}")
+            if ruta_cache:
+                cache.guardar()
+
+        if escritor is not None:
+            segundos_dirty = escritura_dirty.result()
+            escritor.shutdown()
+            registro.agregar({"etapa": "escritura_dirty", "filas_entrada": len(df_completo),
+                              "filas_salida": len(df_completo), "en_segundo_plano": True}, segundos_dirty)
+            print(f"✓ Archivo 'dirty' generado: {archivo_salida_dirty} ({segundos_dirty:.2f} s en segundo plano)")
+
+        # Reordenar columnas para que 'Categorización' esté al final
+        if "Categorización" in df_final.columns:
+            orden_columnas = [
+                                 col for col in df_final.columns if col != "Categorización"
+                             ] + ["Categorización"]
+            df_final = df_final[orden_columnas]
 
         # Crear DataFrame final
-        if registros_finales:
-            df_final = pd.DataFrame(registros_finales)
-
-            # Reordenar columnas para que 'Categorización' esté al final
-            if "Categorización" in df_final.columns:
-                columnas = [
-                               col for col in df_final.columns if col != "Categorización"
-                           ] + ["Categorización"]
-                df_final = df_final[columnas]
-
+        if not df_final.empty:
             # Guardar el archivo final filtrado
-            archivo_salida = "registros_clasificados_por_medicamento_final.csv"
-            df_final.to_csv(archivo_salida, index=False, encoding="utf-8-sig", sep=";")
-
-            print(f"\n=== PROCESO COMPLETADO CON ÉXITO ===")
-            print(f"Archivo 'dirty' (completo): {archivo_salida_dirty}")
-            print(f"Archivo filtrado generado: {archivo_salida}")
-            print(f"Total de registros procesados: {len(df_final)}")
-
-            # Mostrar resumen de categorizaciones
-            print(f"\nResumen de categorizaciones POR REGISTRO:")
-            categorias_count = df_final["Categorización"].value_counts()
-            for categoria, count in categorias_count.items():
-                print(f"  {categoria}: {count} registros")
-
-            print(f"\nTotal de categorías únicas: {len(categorias_count)}")
-
-            # Mostrar distribución por archivo de origen
+            with registro.etapa("escritura_final", len(df_final)) as etapa:
+                df_final.to_csv(archivo_salida, index=False, encoding="utf-8-sig", sep=";")
+                etapa["filas_salida"] = len(df_final)
+            if formato_final is not None:
+                with registro.etapa("escritura_final_particionada", len(df_final)) as etapa:
+                    escribir_final_particionado(df_final, ruta_final_particionado(archivo_salida), formato_final)
+                    etapa["filas_salida"] = len(df_final)
+                print(f"✓ Final particionado ({formato_final}) generado: {ruta_final_particionado(archivo_salida)}")
+            if componentes:
+                with registro.etapa("componentes", len(df_final)) as etapa:
+                    df_componentes = explotar_componentes(df_final, corrector=corrector)
+                    df_componentes.to_csv(ruta_componentes(archivo_salida), index=False, encoding="utf-8-sig", sep=";")
+                    etapa["filas_salida"] = len(df_componentes)
+                print(f"✓ Componentes generados: {ruta_componentes(archivo_salida)} ({len(df_componentes)} filas)")
+
+            origen_count = None
             if 'archivo_origen' in df_final.columns:
-                print(f"\nDistribución por archivo de origen:")
                 origen_count = df_final['archivo_origen'].value_counts()
-                for origen, count in origen_count.items():
-                    print(f"  {origen}: {count} registros")
+            mostrar_resumen(archivo_salida_dirty, archivo_salida, len(df_final),
+                            df_final["Categorización"].value_counts(), origen_count)
 
         else:
             print("No se encontraron registros con medicamentos de interés")
+            if incremental:
+                # Salidas vacías (solo encabezados): las próximas ejecuciones incrementales anexan a ellas
+                df_final.to_csv(archivo_salida, index=False, encoding="utf-8-sig", sep=";")
+                if formato_final is not None:
+                    escribir_final_particionado(df_final, ruta_final_particionado(archivo_salida), formato_final)
+                    os.makedirs(ruta_final_particionado(archivo_salida), exist_ok=True)
+                if componentes:
+                    explotar_componentes(df_final, corrector=corrector).to_csv(
+                        ruta_componentes(archivo_salida), index=False, encoding="utf-8-sig", sep=";")
+
+        # El manifiesto se guarda aunque no haya registros de interés, así la próxima ejecución es incremental
+        if incremental:
+            guardar_manifiesto(archivo_salida, opciones, estados, df_completo)
 
     except Exception as e:
+        resultado = {"estado": "error", "error": f"{type(e).__name__}: {e}"}
         print(f"Error durante la ejecución: {str(e)}")
         import traceback
         traceback.print_exc()
 
+    finally:
+        if fechas_invalidas:
+            print("\nFechas inválidas (quedan vacías): " +
+                  ", ".join(f"{columna}: {cantidad}" for columna, cantidad in fechas_invalidas.items()))
+        if correcciones:
+            print("\nCorrecciones de typos aplicadas:")
+            for (palabra, medicamento), registros in correcciones.most_common():
+                print(f"  {palabra} -> {medicamento}: {registros} registros")
+        if registro.etapas:
+            print(f"\n{registro.resumen()}")
+        if ruta_reporte:
+            parametros = {"modo": modo, "tamano_bloque": tamano_bloque, "workers": workers,
+                          "proyectar_columnas": proyectar_columnas, "incremental": incremental,
+                          "formato_dirty": formato_dirty, "correccion_typos": correccion_typos,
+                          "campos_numericos": campos_numericos, "fechas": fechas, "formato_final": formato_final,
+                          "componentes": componentes, "archivos": archivos}
+            registro.guardar(ruta_reporte, **resultado, parametros=parametros,
+                             cache_clasificacion=cache.estadisticas() if cache is not None else None,
+                             correcciones_typos=reporte_correcciones(correcciones) if corrector is not None else None,
+                             fechas_invalidas=fechas_invalidas)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,312 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Almacén de características de la fase de modelado: la matriz de diseño codificada de target_sm se construye
+# una sola vez por combinación de archivo de entrada (sha256) y lista de características, y se guarda como
+# .npy junto con los codificadores ajustados. Las celdas de modelado la abren con mmap (sin releer el CSV ni
+# recodificar) y la búsqueda con validación cruzada reparte los pliegues entre procesos que abren el mismo
+# archivo: la matriz vive una sola vez en la caché de páginas del sistema operativo
+
+
+RUTA_DATASET_MODELADO = "dataset_final_para_modelado.csv"
+DIRECTORIO_ALMACEN = "cache_caracteristicas"
+
+# Variable objetivo (consenso AHA 2009, el más completo) y columnas que no entran al modelo: identificadores,
+# texto libre, las otras definiciones de SM y el consenso RI (fuga de información), categorías derivadas de
+# las variables numéricas y columnas administrativas de medicamentos (se conserva categorizacion_lista)
+COLUMNA_OBJETIVO = "sm_aha_2009"
+COLUMNAS_EXCLUIDAS = [
+    "id_registro", "id_paciente", "fecha_atencion", "fecha_consulta",
+    "desdxppal", "desdxrel1", "motivo_consulta",
+    "sm_oms_1999", "sm_oms_criterios_n", "sm_ncep_atp3", "sm_ncep_criterios_n",
+    "sm_idf_2006", "sm_idf_criterios_n", "sm_aha_2009", "sm_aha_criterios_n",
+    "sm_alad_2009", "sm_alad_criterios_n", "ri_consenso_n_indices", "ri_diagnostico_consenso",
+    "categoria_glucosa", "categoria_imc", "riesgo_cardiovascular",
+    "ri_tyg_categoria", "ri_tyg_imc_categoria", "ri_tg_hdl_categoria", "ri_mets_ir_categoria",
+    "medicamentos_periodo", "num_entregas_medicamentos", "fechas_entregas",
+    "cantidad_mg_lista", "frecuencia_hrs_lista", "unidades_dosis_lista",
+    "dias_duracion_lista", "medicamentos_unicos",
+    "tiene_consulta_siguiente", "anio", "edad_grupo", "target_sm",
+]
+
+# Características binarias derivadas de categorizacion_lista: nombre y subcadena que la activa
+COLUMNA_CATEGORIZACION = "categorizacion_lista"
+VALOR_SIN_MEDICAMENTOS = "NO_MEDICAMENTOS"
+INDICADORES_MEDICAMENTOS = {"tiene_ge": "GE", "tiene_hidro": "Hidro", "tiene_meto": "Meto"}
+
+# Versión del procedimiento de codificación: cambiarla invalida las matrices guardadas
+VERSION_CODIFICACION = 1
+
+# Las filas se guardan en un orden aleatorio fijo, así cada pliegue de la validación cruzada es un bloque
+# contiguo de la matriz (una vista del mmap, sin copiar filas)
+SEMILLA_ORDEN = 0
+PLIEGUES = 5
+
+# Penalizaciones de la búsqueda por defecto (regresión ridge sobre la matriz estandarizada)
+ALFAS_RIDGE = (0.01, 0.1, 1, 10, 100, 1000)
+
+# Matriz y objetivo abiertos con mmap en cada proceso de la búsqueda (ver abrir_en_trabajador)
+MATRIZ_TRABAJADOR = None
+
+
+def a_snake_case(nombre):
+    """Nombre de columna en snake_case (año -> anio, TyG_index -> tyg_index), como en la fase de modelado"""
+    if not isinstance(nombre, str):
+        return nombre
+    nombre = nombre.replace("año", "anio")
+    nombre = re.sub(r"(.)([A-Z][a-z]+)", r"\1_\2", nombre)
+    nombre = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", nombre)
+    nombre = nombre.lower().replace(" ", "_").replace("-", "_").replace(".", "_").replace("ty_g", "tyg")
+    return re.sub(r"_+", "_", nombre).strip("_")
+
+
+def leer_dataset_modelado(ruta=RUTA_DATASET_MODELADO, sep=";", columnas=None):
+    """Lee el dataset final con los nombres de columna en snake_case (solo las columnas indicadas, si se dan)"""
+    usecols = None if columnas is None else (lambda nombre: a_snake_case(nombre) in columnas)
+    df = pd.read_csv(ruta, sep=sep, encoding="utf-8-sig", usecols=usecols)
+    return df.rename(columns=a_snake_case)
+
+
+def columnas_caracteristicas(df, excluidas=COLUMNAS_EXCLUIDAS):
+    """Características disponibles para el modelo: todas las columnas que no están excluidas"""
+    return [columna for columna in df.columns if columna not in excluidas]
+
+
+def sha256_archivo(ruta):
+    """sha256 del contenido de un archivo, leído por bloques"""
+    sha256 = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+def clave_almacen(sha256_entrada, caracteristicas, sep):
+    """Clave de la entrada del almacén: contenido del archivo, características, separador y versión"""
+    clave = json.dumps([sha256_entrada, caracteristicas, sep, COLUMNA_OBJETIVO, VERSION_CODIFICACION])
+    return hashlib.sha256(clave.encode("utf-8")).hexdigest()[:24]
+
+
+def agregar_indicadores_medicamentos(X):
+    """Agrega a X las características derivadas de categorizacion_lista (evaluadas una vez por valor distinto)"""
+    X[COLUMNA_CATEGORIZACION] = X[COLUMNA_CATEGORIZACION].fillna(VALOR_SIN_MEDICAMENTOS)
+    codigos, distintos = pd.factorize(X[COLUMNA_CATEGORIZACION])
+    distintos = pd.Series(distintos, dtype=str)
+    derivadas = {nombre: distintos.str.contains(subcadena, regex=False) for nombre, subcadena in
+                 INDICADORES_MEDICAMENTOS.items()}
+    derivadas["es_monoterapia"] = distintos.str.contains("univ", regex=False) & ~distintos.str.contains("&",
+                                                                                                       regex=False)
+    derivadas["num_grupos_med"] = distintos.str.count("&") + 1
+    for nombre, valores in derivadas.items():
+        X[nombre] = valores.to_numpy(dtype=np.int64)[codigos]
+
+
+def textos_de_columna(serie):
+    """Códigos por fila y textos de los valores distintos de una columna categórica
+
+    Los nulos se codifican como el texto "nan" (igual que en la fase de modelado): su código -1 indexa el
+    último texto
+    """
+    codigos, distintos = pd.factorize(serie)
+    return codigos, np.array([str(valor) for valor in distintos] + ["nan"], dtype=object)
+
+
+def ajustar_codificadores(X):
+    """Codificadores ajustados a X y la matriz de X ya codificada y estandarizada
+
+    Cada columna tiene sus clases ordenadas (categóricas, como LabelEncoder) o su mediana de imputación
+    (numéricas), y todas una media y una escala (como StandardScaler)
+    """
+    codificadores = {"columnas": list(X.columns), "clases": {}, "medianas": {}}
+    for columna in X.columns:
+        if pd.api.types.is_numeric_dtype(X[columna]):
+            mediana = X[columna].astype(np.float64).median()
+            codificadores["medianas"][columna] = None if pd.isna(mediana) else float(mediana)
+        else:
+            codigos, textos = textos_de_columna(X[columna])
+            presentes = textos if (codigos == -1).any() else textos[:-1]
+            codificadores["clases"][columna] = sorted(set(presentes))
+    matriz = codificar(X, codificadores, estandarizar=False)
+    media = matriz.mean(axis=0)
+    escala = matriz.std(axis=0)
+    # Una columna constante se deja sin escalar (como StandardScaler)
+    escala[escala == 0] = 1
+    codificadores["media"] = media.tolist()
+    codificadores["escala"] = escala.tolist()
+    matriz -= media
+    matriz /= escala
+    return codificadores, matriz
+
+
+def codificar(X, codificadores, estandarizar=True):
+    """Matriz float64 (C contigua) de X con los codificadores ajustados
+
+    Las categorías que no estaban al ajustar se codifican como -1 y los nulos numéricos toman la mediana
+    """
+    matriz = np.empty((len(X), len(codificadores["columnas"])), dtype=np.float64)
+    for j, columna in enumerate(codificadores["columnas"]):
+        if columna in codificadores["clases"]:
+            clases = np.array(codificadores["clases"][columna], dtype=object)
+            codigos, textos = textos_de_columna(X[columna])
+            posiciones = np.searchsorted(clases, textos)
+            conocidas = posiciones < len(clases)
+            conocidas[conocidas] = clases[posiciones[conocidas]] == textos[conocidas]
+            matriz[:, j] = np.where(conocidas, posiciones, -1)[codigos]
+        else:
+            valores = pd.to_numeric(X[columna], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            mediana = codificadores["medianas"][columna]
+            matriz[:, j] = np.where(np.isnan(valores), np.nan if mediana is None else mediana, valores)
+    if estandarizar:
+        matriz -= np.array(codificadores["media"])
+        matriz /= np.array(codificadores["escala"])
+    return matriz
+
+
+def construir_almacen(ruta=RUTA_DATASET_MODELADO, caracteristicas=None, directorio=DIRECTORIO_ALMACEN, sep=";"):
+    """Devuelve la carpeta con X.npy, y.npy, orden.npy y codificadores.json del archivo indicado
+
+    La matriz se construye solo si no hay una entrada con el mismo contenido de entrada (sha256) y la misma
+    lista de características (None = todas las no excluidas, más las derivadas de categorizacion_lista)
+    """
+    sha256_entrada = sha256_archivo(ruta)
+    if caracteristicas is None:
+        encabezado = pd.read_csv(ruta, sep=sep, encoding="utf-8-sig", nrows=0).rename(columns=a_snake_case)
+        caracteristicas = columnas_caracteristicas(encabezado)
+    carpeta = os.path.join(directorio, clave_almacen(sha256_entrada, caracteristicas, sep))
+    if os.path.exists(os.path.join(carpeta, "codificadores.json")):
+        print(f"✓ Matriz de características reutilizada de {carpeta}")
+        return carpeta
+
+    inicio = time.perf_counter()
+    df = leer_dataset_modelado(ruta, sep, set(caracteristicas) | {COLUMNA_OBJETIVO})
+    X = df[caracteristicas].copy()
+    y = df[COLUMNA_OBJETIVO].astype(np.int8).to_numpy()
+    if COLUMNA_CATEGORIZACION in X.columns:
+        agregar_indicadores_medicamentos(X)
+    codificadores, matriz = ajustar_codificadores(X)
+    orden = np.random.default_rng(SEMILLA_ORDEN).permutation(len(matriz))
+
+    # Se escribe en una carpeta temporal y se renombra: un proceso interrumpido no deja una entrada a medias
+    temporal = carpeta + ".tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    np.save(os.path.join(temporal, "X.npy"), matriz[orden])
+    np.save(os.path.join(temporal, "y.npy"), y[orden])
+    np.save(os.path.join(temporal, "orden.npy"), orden)
+    with open(os.path.join(temporal, "codificadores.json"), "w", encoding="utf-8") as f:
+        json.dump({**codificadores, "archivo": os.path.abspath(ruta), "sha256": sha256_entrada, "sep": sep,
+                   "caracteristicas": caracteristicas, "objetivo": COLUMNA_OBJETIVO,
+                   "version": VERSION_CODIFICACION}, f, ensure_ascii=False, indent=1)
+    shutil.rmtree(carpeta, ignore_errors=True)
+    os.replace(temporal, carpeta)
+    print(f"✓ Matriz de características {matriz.shape} guardada en {carpeta} "
+          f"({time.perf_counter() - inicio:.2f} s)")
+    return carpeta
+
+
+def abrir_almacen(carpeta):
+    """X, y (arreglos de solo lectura abiertos con mmap) y codificadores de una entrada del almacén"""
+    X = np.load(os.path.join(carpeta, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(carpeta, "y.npy"), mmap_mode="r")
+    with open(os.path.join(carpeta, "codificadores.json"), encoding="utf-8") as f:
+        codificadores = json.load(f)
+    return X, y, codificadores
+
+
+def auc(y, puntajes):
+    """Área bajo la curva ROC por rangos (los empates cuentan la mitad); NaN si hay una sola clase"""
+    positivos = int(y.sum())
+    negativos = len(y) - positivos
+    if positivos == 0 or negativos == 0:
+        return float("nan")
+    rangos = pd.Series(puntajes).rank().to_numpy()
+    return float((rangos[y == 1].sum() - positivos * (positivos + 1) / 2) / (positivos * negativos))
+
+
+def evaluar_ridge(X, y, prueba, lista_parametros):
+    """AUC en el pliegue de prueba de una regresión ridge (con intercepto) por cada {"alfa": ...} de la lista
+
+    El pliegue es un bloque contiguo: el entrenamiento se arma sumando productos de las dos vistas que lo
+    rodean, sin copiar filas, y la matriz X'X se factoriza una vez por alfa
+    """
+    entrenamiento = [X[:prueba.start], X[prueba.stop:]]
+    y_entrenamiento = [y[:prueba.start], y[prueba.stop:]]
+    columnas = X.shape[1]
+    gram = np.zeros((columnas + 1, columnas + 1))
+    producto = np.zeros(columnas + 1)
+    for bloque, objetivo in zip(entrenamiento, y_entrenamiento):
+        objetivo = np.asarray(objetivo, dtype=np.float64)
+        gram[:columnas, :columnas] += bloque.T @ bloque
+        sumas = bloque.sum(axis=0)
+        gram[:columnas, columnas] += sumas
+        gram[columnas, :columnas] += sumas
+        gram[columnas, columnas] += len(bloque)
+        producto[:columnas] += bloque.T @ objetivo
+        producto[columnas] += objetivo.sum()
+
+    puntajes = []
+    for parametros in lista_parametros:
+        # El intercepto (última fila y columna) no se penaliza
+        penalizada = gram + np.diag(np.append(np.full(columnas, parametros["alfa"]), 0))
+        coeficientes = np.linalg.solve(penalizada, producto)
+        prediccion = X[prueba] @ coeficientes[:columnas] + coeficientes[columnas]
+        puntajes.append(auc(np.asarray(y[prueba]), prediccion))
+    return puntajes
+
+
+def abrir_en_trabajador(carpeta):
+    """Inicializador de cada proceso de la búsqueda: abre la matriz con mmap (no se envía por el pool)"""
+    global MATRIZ_TRABAJADOR
+    X, y, _ = abrir_almacen(carpeta)
+    MATRIZ_TRABAJADOR = (X, y)
+
+
+def evaluar_pliegue(evaluar, inicio, fin, lista_parametros):
+    """Tarea del pool: evalúa todas las combinaciones de parámetros en el pliegue [inicio, fin)"""
+    X, y = MATRIZ_TRABAJADOR
+    return evaluar(X, y, slice(inicio, fin), lista_parametros)
+
+
+def busqueda_validacion_cruzada(carpeta, lista_parametros=None, pliegues=PLIEGUES, workers=None,
+                                evaluar=evaluar_ridge):
+    """Validación cruzada de cada combinación de parámetros, con un pliegue por tarea repartido entre procesos
+
+    evaluar(X, y, prueba, lista_parametros) debe ser una función de módulo (se envía al pool por nombre) que
+    devuelva un puntaje por combinación. Devuelve [{"parametros", "media", "desviacion", "puntajes"}] de la
+    mejor a la peor combinación
+    """
+    if lista_parametros is None:
+        lista_parametros = [{"alfa": alfa} for alfa in ALFAS_RIDGE]
+    filas = len(np.load(os.path.join(carpeta, "y.npy"), mmap_mode="r"))
+    limites = np.linspace(0, filas, pliegues + 1).astype(int)
+    workers = min(workers or os.cpu_count() or 1, pliegues)
+    with ProcessPoolExecutor(max_workers=workers, initializer=abrir_en_trabajador, initargs=(carpeta,)) as pool:
+        por_pliegue = list(pool.map(evaluar_pliegue, [evaluar] * pliegues, limites[:-1], limites[1:],
+                                    [lista_parametros] * pliegues))
+
+    resultados = []
+    for i, parametros in enumerate(lista_parametros):
+        puntajes = [puntajes_pliegue[i] for puntajes_pliegue in por_pliegue]
+        resultados.append({"parametros": parametros, "media": float(np.mean(puntajes)),
+                           "desviacion": float(np.std(puntajes)), "puntajes": puntajes})
+    return sorted(resultados, key=lambda resultado: -np.nan_to_num(resultado["media"], nan=-np.inf))
+
+
+if __name__ == "__main__":
+    # Uso: python almacen_caracteristicas.py [dataset_final_para_modelado.csv] [workers]
+    argumentos = sys.argv[1:]
+    carpeta = construir_almacen(argumentos[0] if argumentos else RUTA_DATASET_MODELADO)
+    workers = int(argumentos[1]) if len(argumentos) > 1 else None
+    inicio = time.perf_counter()
+    for resultado in busqueda_validacion_cruzada(carpeta, workers=workers):
+        print(f"  {resultado['parametros']}: AUC {resultado['media']:.4f} ± {resultado['desviacion']:.4f}")
+    print(f"✓ Búsqueda con validación cruzada en {time.perf_counter() - inicio:.2f} s")
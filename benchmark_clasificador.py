@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import subprocess
+
+import pandas as pd
+
+import DADO
+
+
+# Textos representativos de la columna Medicamento (tomados de los archivos shrinked y de combinaciones frecuentes)
+TEXTOS_MUESTRA = [
+    "CARVEDILOL 625 MG",
+    "METOPROLOL TARTRATO  100 MG TABLETA O GRAGEA",
+    "METOPROLOL TARTRATO  50 MG TABLETA O GRAGEA",
+    "OMEPRAZOL  20 MG CÁPSULA",
+    "ALUMINIO HIDRÓXIDO + MAGNESIO HIDRÓXIDO CON O SIN SIMETICONA  2 - 6% + 1 - 4% SUSPENSIÓN ORAL",
+    "LOSARTAN + HIDROCLOROTIAZIDA 50 MG + 12.5 MG TABLETA",
+    "LOSARTAN POTASICO 50 MG TABLETA",
+    "AMLODIPINO 5 MG TABLETA",
+    "ENALAPRIL MALEATO 20 MG TABLETA",
+    "HIDROCLOROTIAZIDA 25 MG TABLETA",
+    "ACETAMINOFEN 500 MG TABLETA",
+    "FUROSEMIDA 40 MG TABLETA",
+    "VALSARTAN / AMLODIPINO 160 MG / 5 MG",
+    "ATORVASTATINA 20 MG TABLETA",
+    "METFORMINA 850 MG TABLETA",
+    "ESPIRONOLACTONA 25 MG TABLETA",
+]
+
+# Programa que mide, en un intérprete nuevo, cuánto tarda un proceso "spawn" del pool (que solo importa el
+# módulo indicado) en entregar su primera clasificación
+CODIGO_TRABAJADOR = """
+import time, importlib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import clasificador
+inicio = time.perf_counter()
+with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"), initializer=importlib.import_module,
+                         initargs=({modulo!r},)) as pool:
+    pool.submit(clasificador.determinar_categorizacion_por_registro, "LOSARTAN 50 MG").result()
+    print(time.perf_counter() - inicio)
+"""
+
+
+def medir(funcion, textos, repeticiones):
+    """Devuelve el mejor tiempo (segundos) de aplicar la función a todos los textos"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for texto in textos:
+            funcion(texto)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def benchmark_buscador(num_textos=100_000, repeticiones=3):
+    """Compara el buscador de una sola pasada contra la versión original de 28 búsquedas"""
+    textos = (TEXTOS_MUESTRA * (num_textos // len(TEXTOS_MUESTRA) + 1))[:num_textos]
+
+    # Verificar que ambos buscadores devuelven exactamente los mismos grupos
+    for texto in TEXTOS_MUESTRA:
+        nuevo = set(DADO.buscar_medicamentos_exactos(texto))
+        referencia = set(DADO.buscar_medicamentos_exactos_referencia(texto))
+        if nuevo != referencia:
+            raise AssertionError(f"Diferencia en '{texto}': {nuevo} != {referencia}")
+
+    t_referencia = medir(DADO.buscar_medicamentos_exactos_referencia, textos, repeticiones)
+    t_nuevo = medir(DADO.buscar_medicamentos_exactos, textos, repeticiones)
+
+    print(f"=== BENCHMARK buscar_medicamentos_exactos ({num_textos} textos) ===")
+    print(f"  Referencia (28 re.search): {t_referencia:.3f} s ({num_textos / t_referencia:,.0f} textos/s)")
+    print(f"  Patrón compilado único:    {t_nuevo:.3f} s ({num_textos / t_nuevo:,.0f} textos/s)")
+    print(f"  Aceleración: {t_referencia / t_nuevo:.1f}x")
+    return t_referencia, t_nuevo
+
+
+def verificar_palabras_no_x_con_tildes(texto_base="LOSARTAN 50 MG"):
+    """Las palabras no-X del catálogo con tildes ("NIÑOS", "AÑOS") no agregan X, con y sin corrector de typos
+
+    Sin corrector, el tokenizador ASCII parte algunas ("CÁPSULA" -> "psula") y cuenta el fragmento como X,
+    como la versión original; esas se informan aparte. Con corrector ninguna puede agregar X
+    """
+    corrector = DADO.CorrectorMedicamentos()
+    referencia = DADO.categoria_de_tokens(DADO.tokenizar_medicamento(texto_base))
+    con_tildes = sorted(palabra for palabra in DADO.CATALOGO["palabras_no_x"] if not palabra.isascii())
+    partidas = []
+    for palabra in con_tildes:
+        texto = f"{texto_base} {palabra.upper()}"
+        con_corrector = DADO.categoria_de_tokens(DADO.tokenizar_medicamento(texto, corrector))
+        if con_corrector != referencia:
+            raise AssertionError(f"'{texto}' con corrector: {con_corrector} (esperado {referencia})")
+        if DADO.categoria_de_tokens(DADO.tokenizar_medicamento(texto)) != referencia:
+            partidas.append(palabra)
+    print(f"✓ {len(con_tildes)} palabras no-X con tildes no agregan X con corrector; "
+          f"{len(con_tildes) - len(partidas)} clasifican igual sin corrector")
+    if partidas:
+        print(f"  Sin corrector se cuenta como X un fragmento de: {', '.join(partidas)}")
+
+
+def construir_registros(num_filas, num_distintos):
+    """DataFrame sintético con la columna Medicamento y num_distintos textos diferentes"""
+    textos = [f"{TEXTOS_MUESTRA[i % len(TEXTOS_MUESTRA)]} {i}" for i in range(num_distintos)]
+    medicamentos = [textos[i % num_distintos] for i in range(num_filas)]
+    return pd.DataFrame({
+        "Secuencia": range(num_filas),
+        "Documento": range(num_filas),
+        "Medicamento": medicamentos,
+        "archivo_origen": "sintetico.csv",
+    })
+
+
+def benchmark_workers(num_filas=1_000_000, num_distintos=200_000, lista_workers=(1, 2, 4, 8)):
+    """Escalamiento de procesar_csv_columnar con 1, 2, 4 y 8 procesos (la salida debe ser idéntica)"""
+    df = construir_registros(num_filas, num_distintos)
+    print(f"=== BENCHMARK workers ({num_filas} filas, {num_distintos} textos distintos) ===")
+
+    referencia = None
+    tiempo_base = None
+    for workers in lista_workers:
+        inicio = time.perf_counter()
+        df_final = DADO.procesar_csv_columnar(df, "Documento", "Medicamento", mostrar=False, workers=workers)
+        segundos = time.perf_counter() - inicio
+
+        salida = df_final.to_csv(index=False, sep=";")
+        if referencia is None:
+            referencia, tiempo_base = salida, segundos
+        elif salida != referencia:
+            raise AssertionError(f"La salida con {workers} workers difiere de la salida con un solo proceso")
+        print(f"  workers={workers}: {segundos:.2f} s ({num_filas / segundos:,.0f} filas/s, {tiempo_base / segundos:.2f}x)")
+
+
+def medir_proceso(argumentos, entrada=None, repeticiones=5):
+    """Mejor tiempo (segundos) y última salida de ejecutar un proceso de Python nuevo en la carpeta del proyecto"""
+    mejor, salida = float("inf"), ""
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run([sys.executable] + argumentos, input=entrada, capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, salida
+
+
+def benchmark_arranque(repeticiones=5):
+    """Arranque en frío: importar clasificador frente a DADO, servicio por stdin y primer resultado de un trabajador"""
+    print(f"=== BENCHMARK arranque en frío (mejor de {repeticiones}) ===")
+    base, _ = medir_proceso(["-c", "pass"], repeticiones=repeticiones)
+    print(f"  Intérprete vacío: {base * 1000:.1f} ms")
+    for modulo in ("clasificador", "DADO"):
+        segundos, _ = medir_proceso(["-c", f"import {modulo}"], repeticiones=repeticiones)
+        print(f"  import {modulo}: {segundos * 1000:.1f} ms (+{(segundos - base) * 1000:.1f} ms)")
+    segundos, _ = medir_proceso(["servicio_clasificacion.py"], "LOSARTAN 50 MG\n", repeticiones)
+    print(f"  Servicio por stdin, un texto: {segundos * 1000:.1f} ms")
+
+    for modulo in ("clasificador", "DADO"):
+        mejor = min(float(medir_proceso(["-c", CODIGO_TRABAJADOR.format(modulo=modulo)], repeticiones=1)[1])
+                    for _ in range(repeticiones))
+        print(f"  Trabajador spawn que importa {modulo}: {mejor * 1000:.1f} ms hasta el primer resultado")
+
+
+if __name__ == "__main__":
+    verificar_palabras_no_x_con_tildes()
+    benchmark_arranque()
+    benchmark_buscador()
+    benchmark_workers()
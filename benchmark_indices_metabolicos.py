@@ -0,0 +1,89 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import indices_metabolicos
+
+
+RUTA_MUESTRA = "shrinked/csv_final_shrinked.csv"
+
+# La muestra se generó con el sexo codificado como H (hombre) / M (mujer): con esos códigos sus "M" usan los
+# cortes de mujer y sus "F" ningún corte por sexo. El extracto real usa M / F (los valores por defecto)
+CODIGOS_SEXO_MUESTRA = ("H", "M")
+
+# Medias y desviaciones de los laboratorios sintéticos (similares a la muestra)
+LABORATORIOS = {
+    "glucosa": (110, 30), "hba1c": (5.9, 1.1), "hdl": (48, 10), "trigliceridos": (140, 45),
+    "peso": (66, 10), "talla": (1.58, 0.08), "presion_sistolica": (124, 14), "presion_diastolica": (80, 12),
+}
+
+# Fracción de laboratorios que se dejan vacíos en los datos sintéticos
+FRACCION_FALTANTES = 0.02
+
+
+def comparar_columnas(esperado, obtenido):
+    """Columnas del motor cuyos valores difieren de los esperados (floats con tolerancia relativa de 1e-7)"""
+    diferentes = []
+    for columna, valores in obtenido.items():
+        if valores.dtype.kind == "f":
+            iguales = np.allclose(valores, esperado[columna], rtol=1e-7, equal_nan=True)
+        else:
+            iguales = (valores.astype(str) == esperado[columna].astype(str)).all()
+        if not iguales:
+            diferentes.append(columna)
+    return diferentes
+
+
+def verificar_muestra(ruta=RUTA_MUESTRA):
+    """Recalcula las columnas SM_* y RI_* de la muestra desde los laboratorios y las compara con las publicadas"""
+    muestra = pd.read_csv(ruta, sep="\t")
+    columnas = list(indices_metabolicos.calcular_indices_metabolicos(muestra))
+    recalculado = indices_metabolicos.agregar_indices_metabolicos(muestra.drop(columns=columnas),
+                                                                  *CODIGOS_SEXO_MUESTRA)
+    diferentes = comparar_columnas(muestra, recalculado[columnas])
+    if diferentes:
+        raise AssertionError(f"Columnas que difieren de {ruta}: {diferentes}")
+    print(f"✓ {len(columnas)} columnas SM_* / RI_* idénticas a {ruta} ({len(muestra)} filas)")
+
+    # Con la codificación del extracto (M / F) solo cambian los criterios de HDL por sexo
+    propio = indices_metabolicos.agregar_indices_metabolicos(muestra)
+    for columna in comparar_columnas(muestra, propio[columnas]):
+        print(f"  con sexo M/F, {columna}: {(propio[columna] != muestra[columna]).sum()} filas distintas")
+
+
+def construir_laboratorios(num_filas, semilla=0):
+    """DataFrame sintético de consultas con laboratorios, sexo, diabetes y algunos valores faltantes"""
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({columna: rng.normal(media, desviacion, num_filas).clip(media / 4)
+                       for columna, (media, desviacion) in LABORATORIOS.items()})
+    for columna in LABORATORIOS:
+        df.loc[rng.random(num_filas) < FRACCION_FALTANTES, columna] = np.nan
+    df["imc"] = df["peso"] / df["talla"] ** 2
+    df["sexo"] = rng.choice(["M", "F"], num_filas)
+    df["tiene_diabetes"] = df["glucosa"] >= 126
+    return df
+
+
+def benchmark_motor(num_filas=5_000_000, repeticiones=3):
+    """Filas por segundo de calcular_indices_metabolicos sobre consultas sintéticas"""
+    df = construir_laboratorios(num_filas)
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = indices_metabolicos.calcular_indices_metabolicos(df)
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    print(f"=== BENCHMARK calcular_indices_metabolicos ({num_filas} filas, mejor de {repeticiones}) ===")
+    print(f"  {mejor:.2f} s ({num_filas / mejor:,.0f} filas/s)")
+    print(f"  TyG_index sin dato: {np.isnan(resultado['TyG_index']).sum()} filas; "
+          f"SM_AHA_2009: {resultado['SM_AHA_2009'].mean():.1%}; "
+          f"RI_diagnostico_consenso: {resultado['RI_diagnostico_consenso'].mean():.1%}")
+    return mejor
+
+
+if __name__ == "__main__":
+    # Uso: python benchmark_indices_metabolicos.py [num_filas]
+    verificar_muestra()
+    benchmark_motor(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
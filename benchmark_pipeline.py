@@ -0,0 +1,199 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import contextlib
+
+import pandas as pd
+
+import DADO
+import generador_datos
+
+
+# Por encima de este número de filas no se mide procesar_csv_por_registro (iterrows tomaría horas con 10M)
+LIMITE_POR_REGISTRO = 1_000_000
+
+# Fracción de caída de filas/s (o de aumento de memoria) respecto a la línea base que se marca como regresión
+TOLERANCIA = 0.25
+
+# Etapas más cortas que esto en la línea base no se comparan por filas/s (el ruido domina)
+SEGUNDOS_MINIMOS = 0.05
+
+RUTA_LINEA_BASE = "benchmark_linea_base.json"
+
+# Bloques en que se parte la entrada al verificar el final particionado en modo por bloques (más de uno, así
+# los bloques siguientes se agregan a los archivos ya escritos)
+BLOQUES_VERIFICACION = 4
+
+
+def medir_etapa(resultados, etapa, filas_entrada, funcion, *args, **kwargs):
+    """Ejecuta una etapa (silenciando sus mensajes), registra tiempo, filas/s y pico de memoria y devuelve su resultado
+
+    filas_entrada=None toma como entrada las filas devueltas (etapas de carga)
+    """
+    with DADO.MonitorMemoria() as monitor, contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        salida = funcion(*args, **kwargs)
+        segundos = time.perf_counter() - inicio
+
+    filas_salida = len(salida) if hasattr(salida, "__len__") else filas_entrada
+    if filas_entrada is None:
+        filas_entrada = filas_salida
+    resultados[etapa] = {
+        "segundos": round(segundos, 3),
+        "filas_entrada": filas_entrada,
+        "filas_salida": filas_salida,
+        "filas_por_segundo": round(filas_entrada / segundos, 1) if segundos > 0 else None,
+        "rss_pico_mb": round(monitor.pico_mb, 1),
+    }
+    print(f"  {etapa:<32} {segundos:8.2f} s {filas_entrada / max(segundos, 1e-9):14,.0f} filas/s "
+          f"{monitor.pico_mb:9.1f} MiB")
+    return salida
+
+
+def ejecutar_benchmark(archivos, directorio_trabajo, limite_por_registro=LIMITE_POR_REGISTRO):
+    """Mide cada etapa del pipeline de main() (y el cruce con las consultas) y devuelve {etapa: métricas}"""
+    resultados = {}
+    df = medir_etapa(resultados, "cargar_y_combinar_datos", None, DADO.cargar_y_combinar_datos,
+                     archivos, None, None, DADO.TIPOS_COLUMNAS)
+    filas = len(df)
+
+    df = medir_etapa(resultados, "estandarizar_nombres_columnas", filas, DADO.estandarizar_nombres_columnas, df)
+    with contextlib.redirect_stdout(io.StringIO()):
+        doc_col, med_col = DADO.identificar_columnas(df)
+
+    df_final = medir_etapa(resultados, "procesar_csv_columnar", filas, DADO.procesar_csv_columnar,
+                           df, doc_col, med_col, mostrar=False)
+    medir_etapa(resultados, "explotar_componentes", filas, DADO.explotar_componentes, df, med_col)
+    if filas <= limite_por_registro:
+        medir_etapa(resultados, "procesar_csv_por_registro", filas, DADO.procesar_csv_por_registro,
+                    df, doc_col, med_col)
+    else:
+        print(f"  procesar_csv_por_registro omitido ({filas} filas > {limite_por_registro})")
+
+    ruta_consultas = generador_datos.ruta_consultas(directorio_trabajo)
+    if os.path.exists(ruta_consultas):
+        consultas = pd.read_csv(ruta_consultas, sep="\t")
+        medir_etapa(resultados, "unir_consultas_entregas", len(consultas) + filas, DADO.unir_consultas_entregas,
+                    consultas, df, col_documento=doc_col, med_col=med_col)
+
+    ruta_final = os.path.join(directorio_trabajo, "benchmark_final.csv")
+    medir_etapa(resultados, "to_csv_final", len(df_final), df_final.to_csv,
+                ruta_final, index=False, encoding="utf-8-sig", sep=";")
+    os.remove(ruta_final)
+
+    if DADO.pyarrow is not None and not df_final.empty:
+        directorio_final = os.path.join(directorio_trabajo, "benchmark_final")
+        medir_etapa(resultados, "escritura_final_particionada", len(df_final), DADO.escribir_final_particionado,
+                    df_final, directorio_final)
+        categoria = df_final["Categorización"].mode()[0]
+        medir_etapa(resultados, "lectura_final_una_categoria", len(df_final), DADO.leer_final_particionado,
+                    directorio_final, categorias=[categoria])
+        shutil.rmtree(directorio_final)
+        verificar_final_por_bloques(archivos, directorio_trabajo, filas)
+    verificar_cambio_de_encoding(directorio_trabajo)
+    return resultados
+
+
+def verificar_final_por_bloques(archivos, directorio_trabajo, filas, bloques=BLOQUES_VERIFICACION):
+    """Escribe el final particionado por bloques (Parquet y Arrow) y verifica que se lea con las filas del CSV"""
+    ruta_final = os.path.join(directorio_trabajo, "verificacion_final.csv")
+    tamano_bloque = max(filas // bloques, 1)
+    for formato in DADO.FORMATOS_FINAL_PARTICIONADO:
+        with contextlib.redirect_stdout(io.StringIO()):
+            total, _, _ = DADO.procesar_en_streaming(archivos, None, ruta_final, tamano_bloque=tamano_bloque,
+                                                     formato_final=formato)
+        leidos = len(DADO.leer_final_particionado(DADO.ruta_final_particionado(ruta_final), formato))
+        shutil.rmtree(DADO.ruta_final_particionado(ruta_final))
+        os.remove(ruta_final)
+        if leidos != total:
+            raise AssertionError(f"Final particionado ({formato}) por bloques de {tamano_bloque}: "
+                                 f"{leidos} filas leídas de {total}")
+        print(f"✓ Final particionado ({formato}) por bloques de {tamano_bloque}: {leidos} filas, igual al CSV")
+
+
+def verificar_cambio_de_encoding(directorio_trabajo, num_filas=5000, tamano_bloque=500):
+    """Lee por bloques un CSV utf-8 con un byte latin-1 tardío, campos entre comillas con saltos de línea y
+    líneas vacías, y verifica que cada registro se entregue una sola vez y con su texto"""
+    ruta = os.path.join(directorio_trabajo, "verificacion_encoding.csv")
+    esperados = []
+    with open(ruta, "wb") as f:
+        f.write("Secuencia;Medicamento\n".encode("utf-8"))
+        for secuencia in range(num_filas):
+            medicamento = "LOSARTÁN 50 MG" if secuencia % 7 else "LOSARTAN\n50 MG"
+            # Un solo registro en latin-1, más allá de la muestra con que se detecta el encoding
+            encoding = "latin-1" if secuencia == num_filas * 3 // 4 else "utf-8"
+            f.write(f'{secuencia};"{medicamento}"\n'.encode(encoding))
+            if secuencia % 50 == 0:
+                f.write(b"\n")
+            esperados.append(medicamento)
+
+    encoding, sep, _ = DADO.formato_de_archivo(ruta)
+    if encoding != "utf-8":
+        raise AssertionError(f"{ruta} se detectó como {encoding}, no utf-8")
+    with contextlib.redirect_stdout(io.StringIO()):
+        bloques = list(DADO.leer_csv_por_bloques(ruta, encoding, sep, None, tamano_bloque))
+    os.remove(ruta)
+    leidos = pd.concat(bloques, ignore_index=True)
+    secuencias = leidos["Secuencia"].astype(int).tolist()
+    if secuencias != list(range(num_filas)) or leidos["Medicamento"].tolist() != esperados:
+        raise AssertionError(f"Lectura por bloques con un byte latin-1 tardío: {len(leidos)} registros de {num_filas} "
+                             f"o con texto distinto")
+    print(f"✓ Lectura por bloques con un byte latin-1 tardío: {len(leidos)} registros, sin repetir ni perder")
+
+
+def comparar_con_linea_base(resultados, linea_base, tolerancia=TOLERANCIA):
+    """Lista de regresiones: etapas con menos filas/s o más memoria pico que la línea base (más allá de la tolerancia)"""
+    regresiones = []
+    for etapa, metricas in resultados.items():
+        base = linea_base.get(etapa)
+        if not base:
+            continue
+        comparable = base["segundos"] >= SEGUNDOS_MINIMOS and base["filas_por_segundo"]
+        if comparable and metricas["filas_por_segundo"] < base["filas_por_segundo"] * (1 - tolerancia):
+            regresiones.append(f"{etapa}: {metricas['filas_por_segundo']:,.0f} filas/s "
+                               f"(línea base {base['filas_por_segundo']:,.0f})")
+        if metricas["rss_pico_mb"] > base["rss_pico_mb"] * (1 + tolerancia):
+            regresiones.append(f"{etapa}: {metricas['rss_pico_mb']:.0f} MiB de pico "
+                               f"(línea base {base['rss_pico_mb']:.0f})")
+    return regresiones
+
+
+def main(etiqueta="10k", directorio="sintetico", ruta_linea_base=RUTA_LINEA_BASE, guardar_linea_base=False,
+         semilla=0):
+    """Genera (si hace falta) los datos del tamaño indicado, mide cada etapa y compara con la línea base
+
+    Devuelve la lista de regresiones encontradas (vacía si no hay línea base para ese tamaño)
+    """
+    carpeta = os.path.join(directorio, etiqueta)
+    archivos = generador_datos.generar_archivos(carpeta, generador_datos.TAMANOS[etiqueta], semilla)
+
+    print(f"=== BENCHMARK del pipeline ({etiqueta}, pandas {pd.__version__}) ===")
+    resultados = ejecutar_benchmark(archivos, carpeta)
+
+    linea_base = {}
+    if os.path.exists(ruta_linea_base):
+        with open(ruta_linea_base, encoding="utf-8") as f:
+            linea_base = json.load(f)
+
+    regresiones = comparar_con_linea_base(resultados, linea_base.get(etiqueta, {}))
+    for regresion in regresiones:
+        print(f"✗ REGRESIÓN {regresion}")
+    if etiqueta in linea_base and not regresiones:
+        print("✓ Sin regresiones respecto a la línea base")
+
+    if guardar_linea_base:
+        linea_base[etiqueta] = resultados
+        with open(ruta_linea_base, "w", encoding="utf-8") as f:
+            json.dump(linea_base, f, ensure_ascii=False, indent=1)
+        print(f"✓ Línea base guardada en {ruta_linea_base}")
+    return regresiones
+
+
+if __name__ == "__main__":
+    # Uso: python benchmark_pipeline.py [10k|1M|10M] [--guardar-linea-base]
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    regresiones = main(argumentos[0] if argumentos else "10k", guardar_linea_base="--guardar-linea-base" in sys.argv)
+    sys.exit(1 if regresiones else 0)
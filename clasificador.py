@@ -0,0 +1,417 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from types import MappingProxyType
+from collections import OrderedDict, namedtuple
+
+# Núcleo de la clasificación de medicamentos: catálogo, tokenización, categorías, corrección de typos y
+# caché. Solo usa la biblioteca estándar, así que importarlo toma milisegundos (scripts cortos, el
+# servicio de clasificación y los procesos del pool); pandas solo se carga en DADO, con los DataFrames
+
+
+# Catálogo de medicamentos, grupos (en orden jerárquico), etiquetas y palabras no-X. Se edita en el
+# archivo de datos y se compila una sola vez al importar el módulo en índices inmutables
+RUTA_CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalogo_medicamentos.json")
+with open(RUTA_CATALOGO, encoding="utf-8") as archivo_catalogo:
+    CATALOGO = json.load(archivo_catalogo)
+
+ORDEN_GRUPOS = tuple(grupo["grupo"] for grupo in CATALOGO["grupos"])
+ETIQUETAS_GRUPOS = MappingProxyType({grupo["grupo"]: grupo["etiqueta"] for grupo in CATALOGO["grupos"]})
+MEDICAMENTOS_EXACTOS = MappingProxyType(
+    {medicamento: grupo["grupo"] for grupo in CATALOGO["grupos"] for medicamento in grupo["medicamentos"]}
+)
+# Grupos especiales (GE): en combinaciones se abrevian en un solo prefijo "GE <abreviatura>"
+ABREVIATURAS_GE = MappingProxyType(CATALOGO["grupos_especiales"]["abreviaturas"])
+ABREVIATURA_GE_AMBOS = CATALOGO["grupos_especiales"]["ambos"]
+
+# Alternación única compilada una vez: nombres más largos primero y \b a ambos lados,
+# así cada coincidencia corresponde a una palabra completa del catálogo
+ALTERNATIVAS_MEDICAMENTOS = "|".join(re.escape(m) for m in sorted(MEDICAMENTOS_EXACTOS, key=len, reverse=True))
+PATRON_MEDICAMENTOS = re.compile(r"\b(" + ALTERNATIVAS_MEDICAMENTOS + r")\b")
+
+# Palabras comunes en descripciones de medicamentos (NO son medicamentos X); los medicamentos del
+# catálogo también lo son, así que no hace falta quitarlos del texto antes de buscar palabras X
+PALABRAS_NO_X = frozenset(CATALOGO["palabras_no_x"]) | frozenset(MEDICAMENTOS_EXACTOS)
+
+# Palabras candidatas a medicamento X y signos de múltiples medicamentos (+, &, "y", "con", "/")
+PATRON_PALABRAS_X = re.compile(r"[a-zA-Z]{4,}")
+PATRON_MULTIPLES = re.compile(r"\+|\&| y | con |/\s*[a-zA-Z]")
+
+# Bit de cada grupo para combinar los grupos de un registro en un solo entero
+BITS_GRUPOS = MappingProxyType({grupo: 1 << posicion for posicion, grupo in enumerate(ORDEN_GRUPOS)})
+
+# Una sola pasada por texto: medicamentos del catálogo, palabras de 4+ letras y separadores de múltiples
+# medicamentos. Las alternativas empiezan por letras o por signos, así que no se tapan entre sí; "/"
+# comprueba la letra siguiente sin consumirla para no cortar el medicamento que viene después
+PATRON_TOKENS = re.compile(
+    r"(?P<medicamento>\b(?:" + ALTERNATIVAS_MEDICAMENTOS + r")\b)"
+    r"|(?P<palabra>[a-zA-Z]{4,})|(?P<separador>\+|\&| y | con |/(?=\s*[a-zA-Z]))"
+)
+
+# Corrección de typos (opcional): distancia de edición máxima según el largo de la palabra. Las palabras
+# de menos de 5 letras solo se aceptan exactas para no confundir abreviaturas con medicamentos, y la
+# distancia 2 se reserva a palabras largas (nimodipino está a distancia 2 de nifedipino)
+DISTANCIA_MAXIMA_TYPOS = 2
+LARGO_MINIMO_DISTANCIA = {1: 5, 2: 11}
+
+
+def es_nulo(valor):
+    """None, NaN, pd.NA o NaT, sin importar pandas"""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return True
+    return type(valor).__name__ in ("NAType", "NaTType")
+
+
+def normalizar_texto(texto):
+    """Normaliza texto para comparaciones más robustas"""
+    if es_nulo(texto):
+        return ""
+    return str(texto).lower().strip()
+
+
+def buscar_medicamentos_exactos(texto_medicamento):
+    """Busca EXACTAMENTE los medicamentos de interés en el texto, evitando falsos positivos"""
+    texto = normalizar_texto(texto_medicamento)
+
+    # Una sola pasada del patrón compilado: cada coincidencia es una palabra completa del catálogo
+    grupos_encontrados = {MEDICAMENTOS_EXACTOS[medicamento] for medicamento in PATRON_MEDICAMENTOS.findall(texto)}
+
+    return list(grupos_encontrados)
+
+
+def buscar_medicamentos_exactos_referencia(texto_medicamento):
+    """Versión original (una búsqueda regex por medicamento), conservada como referencia y para benchmarks"""
+    texto = normalizar_texto(texto_medicamento)
+
+    grupos_encontrados = set()
+
+    # Buscar cada medicamento EXACTAMENTE en el texto
+    for medicamento, grupo in MEDICAMENTOS_EXACTOS.items():
+        # Usar regex para buscar la palabra completa, evitando subcadenas
+        if re.search(r"\b" + re.escape(medicamento) + r"\b", texto):
+            grupos_encontrados.add(grupo)
+
+    return list(grupos_encontrados)
+
+
+# Resultado de la pasada única sobre un texto: máscara de grupos encontrados, palabras X (4+ letras fuera
+# de PALABRAS_NO_X) y separadores de múltiples medicamentos
+TokensMedicamento = namedtuple("TokensMedicamento", ["mascara", "palabras_x", "separadores"])
+
+
+def plegar_acentos(texto):
+    """Quita tildes y diéresis (losartán -> losartan) para que el texto encaje con el catálogo"""
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+# PALABRAS_NO_X sin tildes, para el texto plegado del corrector ("niños" -> "ninos" sigue sin ser X)
+PALABRAS_NO_X_PLEGADAS = frozenset(plegar_acentos(palabra) for palabra in PALABRAS_NO_X)
+
+
+def distancia_edicion(a, b):
+    """Distancia de Damerau-Levenshtein restringida (inserción, borrado, sustitución y transposición)"""
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        anterior2, anterior = anterior, actual
+    return anterior[len(b)]
+
+
+def borrados(palabra, distancia):
+    """La palabra y todas sus variantes con hasta distancia letras borradas"""
+    variantes = {palabra}
+    frontera = {palabra}
+    for _ in range(distancia):
+        frontera = {variante[:i] + variante[i + 1:] for variante in frontera for i in range(len(variante))}
+        variantes |= frontera
+    return variantes
+
+
+class CorrectorMedicamentos:
+    """Corrección de typos en nombres de medicamentos con un índice de borrados simétricos (estilo SymSpell)
+
+    El índice guarda cada borrado de hasta distancia_maxima letras de los nombres del catálogo; una palabra
+    es candidata si comparte algún borrado con un nombre, y se acepta si su distancia de edición real cabe en
+    el máximo permitido para su largo. Cada palabra distinta se busca una sola vez
+    """
+
+    def __init__(self, distancia_maxima=DISTANCIA_MAXIMA_TYPOS):
+        self.distancia_maxima = distancia_maxima
+        self.indice = {}
+        for medicamento in MEDICAMENTOS_EXACTOS:
+            for variante in borrados(medicamento, distancia_maxima):
+                self.indice.setdefault(variante, []).append(medicamento)
+        self.correcciones = {}
+
+    def distancia_permitida(self, palabra):
+        """Distancia máxima aceptada para una palabra de ese largo"""
+        return max((distancia for distancia, largo in LARGO_MINIMO_DISTANCIA.items()
+                    if len(palabra) >= largo and distancia <= self.distancia_maxima), default=0)
+
+    def corregir(self, palabra):
+        """Medicamento del catálogo más cercano a la palabra (o None), con caché por palabra"""
+        if palabra in self.correcciones:
+            return self.correcciones[palabra]
+
+        medicamento = None
+        distancia = self.distancia_permitida(palabra)
+        if distancia and palabra not in PALABRAS_NO_X_PLEGADAS:
+            candidatos = {candidato for variante in borrados(palabra, distancia)
+                          for candidato in self.indice.get(variante, ())}
+            # Menor distancia primero; a igual distancia, el primero del catálogo
+            distancias = sorted((distancia_edicion(palabra, candidato), posicion, candidato)
+                                for posicion, candidato in enumerate(MEDICAMENTOS_EXACTOS) if candidato in candidatos)
+            if distancias and distancias[0][0] <= distancia:
+                medicamento = distancias[0][2]
+
+        self.correcciones[palabra] = medicamento
+        return medicamento
+
+    def correcciones_en(self, texto_medicamento):
+        """Pares (palabra, medicamento) corregidos en un texto, incluidos los reconocidos al quitar tildes"""
+        texto = normalizar_texto(texto_medicamento)
+        con_tildes = [(palabra, plegar_acentos(palabra)) for palabra in re.findall(r"\w+", texto)
+                      if not palabra.isascii()]
+        correcciones = [(palabra, plegada) for palabra, plegada in con_tildes if plegada in MEDICAMENTOS_EXACTOS]
+        palabras = [palabra for _, palabra, _ in PATRON_TOKENS.findall(plegar_acentos(texto)) if palabra]
+        correcciones += [(palabra, self.corregir(palabra)) for palabra in palabras if self.corregir(palabra)]
+        return correcciones
+
+    def parametros(self):
+        """Parámetros que cambian el resultado de la clasificación (para huellas de caché y manifiestos)"""
+        # Claves como texto: así el diccionario es igual al releído desde el manifiesto JSON
+        largo_minimo = {str(distancia): largo for distancia, largo in LARGO_MINIMO_DISTANCIA.items()}
+        # palabras_no_x: comparación con PALABRAS_NO_X_PLEGADAS (invalida cachés de cuando se comparaban con tildes)
+        return {"distancia_maxima": self.distancia_maxima, "largo_minimo": largo_minimo, "palabras_no_x": "plegadas"}
+
+
+def recorrer_medicamento(texto_medicamento, corrector=None):
+    """Normaliza el texto una vez y lo recorre una sola vez con PATRON_TOKENS
+
+    Genera (medicamento, palabra_x, separador) con un solo campo no vacío por token. Con un
+    CorrectorMedicamentos, el texto se compara sin tildes y las palabras que no son del catálogo se corrigen
+    al medicamento más cercano (que se entrega como medicamento) antes de contarlas como X
+    """
+    texto = normalizar_texto(texto_medicamento)
+    palabras_no_x = PALABRAS_NO_X
+    if corrector is not None:
+        texto = plegar_acentos(texto)
+        palabras_no_x = PALABRAS_NO_X_PLEGADAS
+
+    for medicamento, palabra, separador in PATRON_TOKENS.findall(texto):
+        if medicamento or separador:
+            yield medicamento, "", separador
+        elif palabra not in palabras_no_x:
+            corregido = corrector.corregir(palabra) if corrector is not None else None
+            yield (corregido, "", "") if corregido else ("", palabra, "")
+
+
+def tokenizar_medicamento(texto_medicamento, corrector=None):
+    """Máscara de grupos, palabras X y separadores de un texto (ver recorrer_medicamento)"""
+    mascara = 0
+    palabras_x = []
+    separadores = []
+    for medicamento, palabra, separador in recorrer_medicamento(texto_medicamento, corrector):
+        if medicamento:
+            mascara |= BITS_GRUPOS[MEDICAMENTOS_EXACTOS[medicamento]]
+        elif palabra:
+            palabras_x.append(palabra)
+        else:
+            separadores.append(separador)
+
+    return TokensMedicamento(mascara, tuple(palabras_x), tuple(separadores))
+
+
+def medicamentos_de_texto(texto_medicamento, corrector=None):
+    """Medicamentos del catálogo de un texto, en orden de aparición y sin repetir, como los cuenta la
+    clasificación (con el corrector, sin tildes y con las palabras corregidas)"""
+    return list(dict.fromkeys(medicamento for medicamento, _, _ in recorrer_medicamento(texto_medicamento, corrector)
+                              if medicamento))
+
+
+def categoria_de_tokens(tokens):
+    """Etiqueta de un registro ya tokenizado (NO_APLICA si no tiene medicamentos de interés)"""
+    hay_x = bool(tokens.palabras_x or tokens.separadores)
+    return TABLA_CATEGORIAS[tokens.mascara * 2 + hay_x]
+
+
+def tiene_medicamento_x(texto_medicamento, grupos_encontrados):
+    """Determina si hay medicamentos X adicionales de manera más inteligente
+
+    grupos_encontrados ya no se usa (los medicamentos del catálogo están en PALABRAS_NO_X); se conserva
+    por compatibilidad
+    """
+    tokens = tokenizar_medicamento(texto_medicamento)
+    return bool(tokens.palabras_x or tokens.separadores)
+
+
+def determinar_categorizacion_por_registro(medicamento_str):
+    """Determina la categorización INDIVIDUAL para CADA REGISTRO - VERSIÓN MEJORADA"""
+    # Grupos, palabras X y separadores salen de la misma pasada sobre el texto
+    return categoria_de_tokens(tokenizar_medicamento(medicamento_str))
+
+
+def construir_categorizacion(grupos, hay_x):
+    """Construye la etiqueta de categorización a partir de los grupos encontrados y la presencia de X"""
+    # Grupos en el orden jerárquico del catálogo
+    grupos_ordenados = [grupo for grupo in ORDEN_GRUPOS if grupo in grupos]
+
+    # Caso 1: Solo un grupo de interés
+    if len(grupos_ordenados) == 1:
+        if hay_x:
+            return f"{ETIQUETAS_GRUPOS[grupos_ordenados[0]]}-X univ"
+        else:
+            return f"{ETIQUETAS_GRUPOS[grupos_ordenados[0]]} univ"
+
+    # Caso 2: Múltiples grupos de interés; los grupos especiales se unen en un solo prefijo
+    # ("GE Meto", "GE Hidro" o "GE Hidro-Meto") delante de los demás grupos
+    grupos_ge = [grupo for grupo in grupos_ordenados if grupo in ABREVIATURAS_GE]
+    etiquetas = [ETIQUETAS_GRUPOS[grupo] for grupo in grupos_ordenados if grupo not in ABREVIATURAS_GE]
+    if len(grupos_ge) > 1:
+        etiquetas.insert(0, f"GE {ABREVIATURA_GE_AMBOS}")
+    elif grupos_ge:
+        etiquetas.insert(0, f"GE {ABREVIATURAS_GE[grupos_ge[0]]}")
+    etiqueta_base = " && ".join(etiquetas)
+
+    # Añadir X si existe
+    if hay_x:
+        return f"{etiqueta_base} - X"
+    else:
+        return etiqueta_base
+
+
+# Etiqueta de cada combinación posible (grupos, hay X), precalculada al importar: índice = máscara * 2 + hay_x
+TABLA_CATEGORIAS = tuple(
+    construir_categorizacion([grupo for grupo in ORDEN_GRUPOS if (clave >> 1) & BITS_GRUPOS[grupo]], bool(clave & 1))
+    if clave > 1 else "NO_APLICA"
+    for clave in range(2 ** (len(ORDEN_GRUPOS) + 1))
+)
+
+
+def grupos_de_mascara(mascara):
+    """Grupos del catálogo presentes en una máscara de bits, en el orden jerárquico del catálogo"""
+    return [grupo for grupo in ORDEN_GRUPOS if mascara & BITS_GRUPOS[grupo]]
+
+
+def es_registro_de_interes(medicamento_str):
+    """Determina si un registro contiene al menos un medicamento de interés"""
+    return tokenizar_medicamento(medicamento_str).mascara > 0
+
+
+def huella_catalogo(corrector=None):
+    """Huella del catálogo de medicamentos, etiquetas y palabras no-X (invalida cachés guardadas con otro catálogo)
+
+    Con corrección de typos la huella incluye sus parámetros, porque cambian las categorizaciones
+    """
+    contenido = json.dumps(CATALOGO, ensure_ascii=False, sort_keys=True)
+    if corrector is not None:
+        contenido += json.dumps(corrector.parametros(), sort_keys=True)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheClasificacion:
+    """Caché acotada (LRU) de categorizaciones por texto de Medicamento, con contadores y persistencia en disco
+
+    DADO.CacheClasificacion agrega la clasificación de columnas de pandas sobre esta misma caché
+    """
+
+    def __init__(self, tamano_maximo=100_000, ruta=None, corrector=None):
+        self.tamano_maximo = tamano_maximo
+        self.ruta = ruta
+        self.corrector = corrector
+        self.aciertos = 0
+        self.fallos = 0
+        self.entradas = OrderedDict()
+        if ruta and os.path.exists(ruta):
+            self.cargar(ruta)
+
+    def obtener(self, medicamento):
+        """Devuelve la categorización guardada (o None) y actualiza los contadores"""
+        categoria = self.entradas.get(medicamento)
+        if categoria is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+            self.entradas.move_to_end(medicamento)
+        return categoria
+
+    def agregar(self, medicamento, categoria):
+        """Guarda una categorización, descartando la menos usada si se supera el tamaño máximo"""
+        self.entradas[medicamento] = categoria
+        self.entradas.move_to_end(medicamento)
+        while len(self.entradas) > self.tamano_maximo:
+            self.entradas.popitem(last=False)
+
+    def categorias_de_textos(self, textos, nuevas=None):
+        """Categorización de cada texto (diccionario texto -> etiqueta), tokenizando solo los que no están en caché
+
+        nuevas: diccionario opcional donde se registran las clasificaciones calculadas en esta llamada
+        """
+        categorias = {}
+        for texto in textos:
+            categoria = self.obtener(texto)
+            if categoria is None:
+                categoria = categoria_de_tokens(tokenizar_medicamento(texto, self.corrector))
+                self.agregar(texto, categoria)
+                if nuevas is not None:
+                    nuevas[texto] = categoria
+            categorias[texto] = categoria
+        return categorias
+
+    def estadisticas(self):
+        """Resumen de uso de la caché"""
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self.entradas),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+        }
+
+    def guardar(self, ruta=None):
+        """Persiste la caché en disco (JSON) junto con la huella del catálogo"""
+        ruta = ruta or self.ruta
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump({"huella": huella_catalogo(self.corrector), "entradas": self.entradas}, archivo,
+                      ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    def cargar(self, ruta):
+        """Carga una caché persistida; se descarta si fue generada con otro catálogo"""
+        with open(ruta, encoding="utf-8") as archivo:
+            contenido = json.load(archivo)
+        if contenido.get("huella") != huella_catalogo(self.corrector):
+            print(f"Caché {ruta} descartada: el catálogo de medicamentos cambió")
+            return
+        for medicamento, categoria in contenido["entradas"].items():
+            self.agregar(medicamento, categoria)
+        print(f"✓ Caché de clasificación cargada: {len(self.entradas)} entradas desde {ruta}")
+
+
+# Caché propia de cada proceso del pool (se inicializa con las clasificaciones ya conocidas)
+CACHE_TRABAJADOR = None
+
+
+def inicializar_trabajador(entradas, tamano_maximo, distancia_typos=None):
+    """Inicializa la caché del proceso trabajador (con su propio corrector si hay corrección de typos)"""
+    global CACHE_TRABAJADOR
+    corrector = CorrectorMedicamentos(distancia_typos) if distancia_typos is not None else None
+    CACHE_TRABAJADOR = CacheClasificacion(tamano_maximo, corrector=corrector)
+    for medicamento, categoria in entradas.items():
+        CACHE_TRABAJADOR.agregar(medicamento, categoria)
+
+
+def clasificar_particion(textos):
+    """Clasifica una lista de textos distintos dentro de un proceso del pool (sin pandas: solo viajan cadenas)"""
+    aciertos, fallos = CACHE_TRABAJADOR.aciertos, CACHE_TRABAJADOR.fallos
+    nuevas = {}
+    categorias = CACHE_TRABAJADOR.categorias_de_textos(textos, nuevas)
+    return categorias, nuevas, CACHE_TRABAJADOR.aciertos - aciertos, CACHE_TRABAJADOR.fallos - fallos
@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+
+# Tamaños de referencia (filas en total entre los tres archivos)
+TAMANOS = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+
+# Encabezados reales de los extractos (ver shrinked/*_shrinked.csv)
+ENCABEZADO_ANTIHIPERTENSIVOS1 = [
+    "Secuencia", "Documento", "CodProced", "Num_orden", "Medicamento", "Frecuencia", "Dosis", "Via", "TTratamiento",
+    "Empresa", "Cantidad", "Item", "Especialidad", "NumProfe", "MedicoOrdena", "Nom1PAc", "Nom2Pac", "Apell1Pac",
+    "Apell2Pac", "Fechnac", "Sexo", "Direcion", "Tel", "FechaOrden",
+]
+ENCABEZADO_ANTIHIPERTENSIVOS2 = [
+    "Secuencia", "Documento", "CodProced", "Num_orden", "Medicamento", "Frecuencia", "Dosis", "Via", "TTratamiento",
+    "CANTIDAD", "Observaciones", "Item", "Fecha_atencion", "sede_id", "lugar", "num_formula", "nombrepac", "edad",
+    "telefono", "sexo", "direccion", "empresa", "dxppal", "desdxppal",
+]
+
+# Archivo, encabezado, proporción de las filas y proporción de medicamentos de interés.
+# Como en el extracto real, Antihipertensivos2 trae filas con la disposición de Antihipertensivos1
+# bajo su propio encabezado (por eso CANTIDAD contiene la empresa)
+ARCHIVOS = [
+    ("Antihipertensivos1.csv", ENCABEZADO_ANTIHIPERTENSIVOS1, 0.4, 1.0),
+    ("Antihipertensivos2.csv", ENCABEZADO_ANTIHIPERTENSIVOS2, 0.2, 1.0),
+    ("OtrosMedicamentos.csv", ENCABEZADO_ANTIHIPERTENSIVOS1, 0.4, 0.2),
+]
+
+# Textos de Medicamento con su peso relativo: presentaciones de los extractos y combinaciones frecuentes
+MEDICAMENTOS_INTERES = {
+    "LOSARTAN POTASICO 50 MG TABLETA": 12,
+    "LOSARTAN + HIDROCLOROTIAZIDA 50 MG + 12.5 MG TABLETA": 4,
+    "METOPROLOL TARTRATO  100 MG TABLETA O GRAGEA": 8,
+    "METOPROLOL TARTRATO  50 MG TABLETA O GRAGEA": 8,
+    "HIDROCLOROTIAZIDA  25 MG TABLETA": 8,
+    "AMLODIPINO  5 MG TABLETA": 8,
+    "ENALAPRIL MALEATO  20 MG TABLETA": 6,
+    "CARVEDILOL 625 MG": 4,
+    "CARVEDILOL  12.5 MG TABLETA": 4,
+    "ESPIRONOLACTONA  25 MG TABLETA": 3,
+    "FUROSEMIDA  40 MG TABLETA": 3,
+    "VALSARTAN / AMLODIPINO 160 MG / 5 MG": 2,
+    "IRBESARTAN  300 MG TABLETA": 2,
+    "NIFEDIPINO  30 MG TABLETA DE LIBERACIÓN PROLONGADA": 2,
+    "METOPROLOL TARTRATO 50 MG + HIDROCLOROTIAZIDA 25 MG": 2,
+    "AMLODIPINO 5 MG Y ENALAPRIL 20 MG": 1,
+    "LOSARTÁN 50 MG & AMLODIPINO 5 MG": 1,
+    "ENALAPRIL CON HIDROCLOROTIAZIDA": 1,
+    "VALSARTAN + ATORVASTATINA 160 MG + 20 MG": 1,
+    "PROPRANOLOL  40 MG TABLETA": 1,
+    "CAPTOPRIL  25 MG TABLETA": 1,
+    "VERAPAMILO  80 MG TABLETA": 1,
+    "BISOPROLOL  5 MG TABLETA": 1,
+    "TELMISARTAN  80 MG TABLETA": 1,
+    "NEBIVOLOL 5 MG TABLETA": 1,
+    "INDAPAMIDA  2.5 MG TABLETA": 1,
+    "CLONIDINA  150 MCG TABLETA": 1,
+    "PRAZOSINA  1 MG TABLETA": 1,
+}
+MEDICAMENTOS_OTROS = {
+    "OMEPRAZOL  20 MG CÁPSULA": 10,
+    "ALUMINIO HIDRÓXIDO + MAGNESIO HIDRÓXIDO CON O SIN SIMETICONA  2 - 6% + 1 - 4% SUSPENSIÓN ORAL": 4,
+    "ACETÍL SALICÍLICO ÁCIDO  100 MG TABLETA": 8,
+    "ATORVASTATINA  20 MG TABLETA": 8,
+    "METFORMINA  850 MG TABLETA": 8,
+    "ACETAMINOFÉN  500 MG TABLETA": 6,
+    "LOVASTATINA  20 MG TABLETA": 4,
+    "GLIBENCLAMIDA  5 MG TABLETA": 3,
+    "LEVOTIROXINA SÓDICA  50 MCG TABLETA": 3,
+    "INSULINA GLARGINA  100 UI/ML SOLUCIÓN INYECTABLE": 2,
+    "": 1,
+}
+
+# Errores de digitación observados en los extractos (se aplican a una fracción de las filas)
+ERRORES_DIGITACION = {
+    "METOPROLOL": "METROPROLOL",
+    "LOSARTAN": "LOZARTAN",
+    "AMLODIPINO": "AMLODIPINA",
+    "HIDROCLOROTIAZIDA": "HIDROCLOROTIACIDA",
+    "CARVEDILOL": "CARVEDIOL",
+    "ENALAPRIL": "ENALAPRILL",
+    "ESPIRONOLACTONA": "ESPIRONOLACTOMA",
+    "FUROSEMIDA": "FUROSEMIDAA",
+}
+
+FRECUENCIAS = [" Cada 12 HORAS", " Cada 8 HORAS", " Cada DIARIA", " Cada 24 HORAS"]
+DOSIS = ["1  Tabletas", "1  Unidad(es)", "2  Tabletas", "0.5  Tabletas"]
+DURACIONES = ["30 DIA(S)", "60 DIA(S)", "90 DIA(S)", "1 MES(ES)", "3 MES(ES)", "4 MES(ES)"]
+CODIGOS = ["C07AG021", "C07AM017162", "C07AM017161", "C09CA011", "A02BO002101", "A02AA018231"]
+ESPECIALIDADES = [("MEDICINA INTERNA", 916, "JOHON   HERNANDEZ HERRERA"),
+                  ("MEDICO DEL PROGRAMA", 8, "MARTHA LUZ  ESCAMILLA CANO"),
+                  ("MEDICINA GENERAL", 412, "JOSÉ MARÍA  PEÑA ÁVILA")]
+NOMBRES = ["CARLOS", "MARTHA", "NELIA", "OMAIRA", "JOSÉ", "MARÍA", "ÁNGEL", "LUZ", "RAMÓN", "SOFÍA"]
+SEGUNDOS_NOMBRES = ["", "CECILIA", "ESTHER", "DEL ROSARIO", "ANTONIO", "INÉS"]
+APELLIDOS = ["POLO", "CABALLERO", "GARCIA", "FONNEGRA", "ROMERO", "MUÑOZ", "PEÑA", "JIMÉNEZ", "BARRIOS", "NÚÑEZ"]
+DIRECCIONES = ["CALLE 14 N° 17B-127  ", "CRA 15 7-92", "CR15DN 77-47 ALTO DE LOS ROBLES ", ""]
+
+# Consultas de los mismos pacientes (separador tabulador, como csv_final_shrinked), para el cruce con las entregas
+NOMBRE_CONSULTAS = "consultas.csv"
+
+
+def elegir(rng, opciones, n, pesos=None):
+    """n valores tomados de opciones (con pesos relativos opcionales)"""
+    opciones = np.array(list(opciones), dtype=object)
+    if pesos is not None:
+        pesos = np.asarray(pesos, dtype=float) / np.sum(pesos)
+    return opciones[rng.choice(len(opciones), size=n, p=pesos)]
+
+
+def textos_medicamento(rng, n, proporcion_interes, proporcion_errores):
+    """Columna Medicamento: mezcla de medicamentos de interés y otros, con errores de digitación"""
+    interes = elegir(rng, MEDICAMENTOS_INTERES, n, list(MEDICAMENTOS_INTERES.values()))
+    otros = elegir(rng, MEDICAMENTOS_OTROS, n, list(MEDICAMENTOS_OTROS.values()))
+    textos = np.where(rng.random(n) < proporcion_interes, interes, otros)
+
+    # Cada texto distinto se corrige una sola vez; luego se elige por fila entre el original y el erróneo
+    distintos, indices = np.unique(textos.astype(str), return_inverse=True)
+    erroneos = []
+    for texto in distintos:
+        for correcto, error in ERRORES_DIGITACION.items():
+            texto = texto.replace(correcto, error, 1) if correcto in texto else texto
+        erroneos.append(texto)
+    erroneos = np.array(erroneos, dtype=object)[indices]
+    return np.where(rng.random(n) < proporcion_errores, erroneos, distintos.astype(object)[indices])
+
+
+def generar_bloque(rng, num_filas, secuencia_inicial, pacientes, proporcion_interes, proporcion_errores,
+                   fecha_con_hora):
+    """Filas de órdenes de 1 a 4 ítems (misma Secuencia, Documento y fecha) con la disposición de Antihipertensivos1"""
+    items_por_orden = rng.integers(1, 5, size=num_filas)
+    items_por_orden = items_por_orden[:np.searchsorted(np.cumsum(items_por_orden), num_filas) + 1]
+    secuencias = secuencia_inicial + np.cumsum(rng.integers(1, 4, size=len(items_por_orden)))
+    orden = np.repeat(np.arange(len(items_por_orden)), items_por_orden)[:num_filas]
+    inicio_orden = np.concatenate([[0], np.cumsum(items_por_orden)[:-1]])
+    item = (np.arange(num_filas) - inicio_orden[orden]) + 1
+
+    paciente = rng.integers(0, len(pacientes), size=len(items_por_orden))[orden]
+    p = pacientes.iloc[paciente].reset_index(drop=True)
+    especialidad = rng.integers(0, len(ESPECIALIDADES), size=len(items_por_orden))[orden]
+    dias = rng.integers(0, 730, size=len(items_por_orden))[orden]
+    fechas = pd.Timestamp("2018-01-01") + pd.to_timedelta(dias, unit="D")
+    fecha_orden = pd.Series(fechas.day.astype(str) + "/" + fechas.month.astype(str) + "/" + fechas.year.astype(str))
+    if fecha_con_hora:
+        fecha_orden = fecha_orden + " 00:00"
+
+    return pd.DataFrame({
+        "Secuencia": secuencias[orden],
+        "Documento": p["Documento"],
+        "CodProced": elegir(rng, CODIGOS, num_filas),
+        "Num_orden": rng.integers(1, 4, size=num_filas),
+        "Medicamento": textos_medicamento(rng, num_filas, proporcion_interes, proporcion_errores),
+        "Frecuencia": elegir(rng, FRECUENCIAS, num_filas, [5, 2, 4, 1]),
+        "Dosis": elegir(rng, DOSIS, num_filas, [6, 2, 1, 1]),
+        "Via": "ORAL",
+        "TTratamiento": elegir(rng, DURACIONES, num_filas),
+        "Empresa": "SALUD SOCIAL IPS",
+        "Cantidad": rng.integers(1, 361, size=num_filas),
+        "Item": item,
+        "Especialidad": np.array([e[0] for e in ESPECIALIDADES], dtype=object)[especialidad],
+        "NumProfe": np.array([e[1] for e in ESPECIALIDADES])[especialidad],
+        "MedicoOrdena": np.array([e[2] for e in ESPECIALIDADES], dtype=object)[especialidad],
+        "Nom1PAc": p["Nom1PAc"],
+        "Nom2Pac": p["Nom2Pac"],
+        "Apell1Pac": p["Apell1Pac"],
+        "Apell2Pac": p["Apell2Pac"],
+        "Fechnac": p["Fechnac"],
+        "Sexo": p["Sexo"],
+        "Direcion": p["Direcion"],
+        "Tel": p["Tel"],
+        "FechaOrden": fecha_orden,
+    })
+
+
+def generar_pacientes(rng, num_pacientes):
+    """Pacientes con documento, nombres con tildes, sexo y fecha de nacimiento (algunas con el formato roto del extracto)"""
+    nacimiento = pd.Timestamp("1930-01-01") + pd.to_timedelta(rng.integers(0, 60 * 365, size=num_pacientes), unit="D")
+    fechnac = pd.Series(nacimiento.day.astype(str) + "/" + nacimiento.month.astype(str) + "/" + nacimiento.year.astype(str))
+    fechnac[rng.random(num_pacientes) < 0.3] = "00:00.0"
+    return pd.DataFrame({
+        "Documento": rng.choice(np.arange(1_000_000, 99_999_999), size=num_pacientes, replace=False),
+        "Nom1PAc": elegir(rng, NOMBRES, num_pacientes),
+        "Nom2Pac": elegir(rng, SEGUNDOS_NOMBRES, num_pacientes),
+        "Apell1Pac": elegir(rng, APELLIDOS, num_pacientes),
+        "Apell2Pac": elegir(rng, APELLIDOS, num_pacientes),
+        "Fechnac": fechnac,
+        "Sexo": elegir(rng, "MF", num_pacientes),
+        "Direcion": elegir(rng, DIRECCIONES, num_pacientes),
+        "Tel": rng.integers(3_000_000, 3_299_999_999, size=num_pacientes).astype(str),
+    })
+
+
+def generar_consultas(rng, pacientes, consultas_por_paciente=4):
+    """Consultas (id_paciente, fecha_consulta d/m/a) de cada paciente en el mismo período que las órdenes"""
+    num_consultas = rng.integers(1, 2 * consultas_por_paciente, size=len(pacientes))
+    documentos = np.repeat(pacientes["Documento"].to_numpy(), num_consultas)
+    fechas = pd.Timestamp("2018-01-01") + pd.to_timedelta(rng.integers(0, 730, size=len(documentos)), unit="D")
+    return pd.DataFrame({
+        "id_paciente": documentos,
+        "fecha_consulta": fechas.day.astype(str) + "/" + fechas.month.astype(str) + "/" + fechas.year.astype(str),
+    })
+
+
+def ruta_consultas(directorio):
+    """Archivo de consultas sintéticas generado junto a los extractos"""
+    return os.path.join(directorio, "full_size", NOMBRE_CONSULTAS)
+
+
+def generar_archivos(directorio, num_filas, semilla=0, proporcion_errores=0.02, filas_por_bloque=500_000):
+    """Escribe los tres CSV sintéticos (latin-1, separador ";") y las consultas en directorio/full_size
+
+    Devuelve las rutas de los tres CSV (las consultas quedan en ruta_consultas(directorio)). Las mismas
+    semilla y número de filas producen siempre los mismos archivos; si ya existen con esos parámetros no
+    se vuelven a generar
+    """
+    carpeta = os.path.join(directorio, "full_size")
+    ruta_parametros = os.path.join(carpeta, "parametros.json")
+    parametros = {"num_filas": num_filas, "semilla": semilla, "proporcion_errores": proporcion_errores}
+    rutas = [os.path.join(carpeta, nombre) for nombre, _, _, _ in ARCHIVOS]
+    salidas = rutas + [ruta_consultas(directorio)]
+    if os.path.exists(ruta_parametros) and all(os.path.exists(ruta) for ruta in salidas):
+        with open(ruta_parametros, encoding="utf-8") as f:
+            if json.load(f) == parametros:
+                print(f"✓ Datos sintéticos ya generados en {carpeta}")
+                return rutas
+
+    os.makedirs(carpeta, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    pacientes = generar_pacientes(rng, max(num_filas // 20, 10))
+
+    for (nombre, encabezado, proporcion, proporcion_interes), ruta in zip(ARCHIVOS, rutas):
+        filas_archivo = int(num_filas * proporcion)
+        secuencia = 900_000
+        with open(ruta, "w", encoding="latin-1", newline="") as f:
+            f.write(";".join(encabezado) + "\n")
+            for inicio in range(0, filas_archivo, filas_por_bloque):
+                filas = min(filas_por_bloque, filas_archivo - inicio)
+                bloque = generar_bloque(rng, filas, secuencia, pacientes, proporcion_interes, proporcion_errores,
+                                        fecha_con_hora=nombre == "OtrosMedicamentos.csv")
+                secuencia = int(bloque["Secuencia"].iloc[-1])
+                bloque.to_csv(f, sep=";", header=False, index=False)
+        print(f"✓ {ruta}: {filas_archivo} filas")
+
+    consultas = generar_consultas(rng, pacientes)
+    consultas.to_csv(ruta_consultas(directorio), sep="\t", index=False)
+    print(f"✓ {ruta_consultas(directorio)}: {len(consultas)} consultas")
+
+    with open(ruta_parametros, "w", encoding="utf-8") as f:
+        json.dump(parametros, f)
+    return rutas
+
+
+if __name__ == "__main__":
+    etiqueta = sys.argv[1] if len(sys.argv) > 1 else "10k"
+    generar_archivos(os.path.join("sintetico", etiqueta), TAMANOS[etiqueta])
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+# Motor por lotes del síndrome metabólico (cinco definiciones) y de los índices de resistencia a la
+# insulina del CSV final: cada criterio es una comparación de NumPy sobre la columna completa, así que
+# millones de consultas se calculan en una sola pasada. Convenciones ante datos faltantes:
+#   - un laboratorio ausente, no numérico o no positivo es NaN, y los índices que lo usan quedan en NaN
+#   - una categoría RI_*_categoria sin índice queda vacía (NaN)
+#   - un criterio que no se puede evaluar cuenta como no cumplido (los *_criterios_n cuentan los criterios
+#     que sí se cumplen) y un índice sin dato no suma al consenso de resistencia a la insulina
+
+
+# Códigos de la columna sexo del extracto (un sexo distinto o vacío no cumple los criterios por sexo)
+SEXO_MASCULINO = "M"
+SEXO_FEMENINO = "F"
+
+# Umbrales comunes (mg/dL y mmHg): triglicéridos, glucosa en ayunas y presión de NCEP/IDF/AHA/ALAD
+TRIGLICERIDOS_ALTOS = 150
+GLUCOSA_ALTERADA = 100
+PRESION_ALTA = (130, 85)
+
+# HDL bajo como (hombre, mujer): NCEP ATP III, IDF, AHA y ALAD usan el mismo corte; OMS 1999 el suyo
+HDL_BAJO = (40, 50)
+HDL_BAJO_OMS = (35, 39)
+
+# OMS 1999: criterio obligatorio de glucemia alterada (el extracto no trae curva de tolerancia ni insulina,
+# así que se usa la HbA1c en %), presión arterial e IMC de obesidad (estrictamente mayor)
+HBA1C_OMS = 6.0
+PRESION_ALTA_OMS = (140, 90)
+IMC_OBESIDAD_OMS = 30
+
+# Perímetro de cintura (cm) como (hombre, mujer) por definición. Es obligatorio en IDF y ALAD; la columna
+# "cintura" es opcional y, sin ella, esas dos definiciones no se cumplen en ninguna fila
+CINTURA_NCEP = (102, 88)
+CINTURA_IDF = (90, 80)
+CINTURA_AHA = (90, 80)
+CINTURA_ALAD = (94, 88)
+
+# Criterios necesarios para el diagnóstico (en todas las definiciones, contando el obligatorio si lo hay)
+CRITERIOS_MINIMOS_SM = 3
+
+# Categorías de los índices de resistencia a la insulina y, por índice, el valor desde el que empieza
+# cada una después de "Normal" (un corte repetido salta esa categoría). Desde RI_Moderada el índice
+# cuenta como positivo para el consenso
+ETIQUETAS_RI = ["Normal", "Limítrofe", "RI_Moderada", "RI_Alta"]
+CODIGO_RI_POSITIVO = ETIQUETAS_RI.index("RI_Moderada")
+CORTES_RI = {
+    "TyG": (8.0, 8.31, 8.31),
+    "TyG_IMC": (150, 200, 250),
+    "TG_HDL": (2.0, 3.0, 4.0),
+    "METS_IR": (50.39, 50.39, 55.0),
+}
+
+# Índices positivos necesarios para el diagnóstico de resistencia a la insulina por consenso
+INDICES_MINIMOS_CONSENSO = 2
+
+# Columna de cada índice en el CSV final
+COLUMNAS_INDICES_RI = {"TyG": "TyG_index", "TyG_IMC": "TyG_IMC", "TG_HDL": "TG_HDL_ratio", "METS_IR": "METS_IR"}
+
+
+def columna_numerica(df, columna):
+    """Columna como arreglo float64, con NaN si no existe o si el valor no es numérico o no es positivo"""
+    if columna not in df:
+        return np.full(len(df), np.nan)
+    valores = pd.to_numeric(df[columna], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(valores > 0, valores, np.nan)
+
+
+def codigos_sexo(df, sexo_masculino, sexo_femenino):
+    """Código int8 del sexo de cada fila: 0 hombre, 1 mujer, 2 otro o vacío (comparado una vez por valor distinto)"""
+    if "sexo" not in df:
+        return np.full(len(df), 2, dtype=np.int8)
+    codigos, distintos = pd.factorize(df["sexo"])
+    distintos = np.asarray(distintos, dtype=object)
+    por_valor = np.where(distintos == sexo_masculino, 0, np.where(distintos == sexo_femenino, 1, 2))
+    return np.append(por_valor, 2).astype(np.int8)[codigos]
+
+
+def umbral_por_sexo(sexo, umbrales):
+    """Umbral (hombre, mujer) de cada fila según su código de sexo (NaN si es otro: ninguna comparación se cumple)"""
+    return np.array([umbrales[0], umbrales[1], np.nan])[sexo]
+
+
+def contar_criterios(*criterios):
+    """Número de criterios cumplidos por fila (int8)"""
+    total = np.zeros(len(criterios[0]), dtype=np.int8)
+    for criterio in criterios:
+        total += criterio
+    return total
+
+
+def definicion_con_obligatorio(obligatorio, *criterios):
+    """Criterios contados y diagnóstico de una definición con criterio obligatorio (0 criterios si no se cumple)"""
+    criterios_n = np.where(obligatorio, contar_criterios(obligatorio, *criterios), 0).astype(np.int8)
+    return (criterios_n >= CRITERIOS_MINIMOS_SM).astype(np.int8), criterios_n
+
+
+def definicion_sin_obligatorio(*criterios):
+    """Criterios contados y diagnóstico de una definición de "3 de 5" criterios"""
+    criterios_n = contar_criterios(*criterios)
+    return (criterios_n >= CRITERIOS_MINIMOS_SM).astype(np.int8), criterios_n
+
+
+def categorizar_indice(valores, cortes):
+    """Códigos int8 de ETIQUETAS_RI para un índice (-1 donde el índice es NaN)"""
+    codigos = np.zeros(len(valores), dtype=np.int8)
+    for corte in cortes:
+        codigos += valores >= corte
+    codigos[np.isnan(valores)] = -1
+    return codigos
+
+
+def calcular_indices_metabolicos(df, sexo_masculino=SEXO_MASCULINO, sexo_femenino=SEXO_FEMENINO):
+    """Síndrome metabólico (OMS 1999, NCEP ATP III, IDF 2006, AHA 2009 y ALAD 2009) e índices de resistencia a la
+    insulina (TyG, TyG-IMC, TG/HDL y METS-IR) de todas las filas del DataFrame en una sola pasada
+
+    Usa glucosa, hba1c, hdl, trigliceridos, imc (o peso y talla en metros), presion_sistolica,
+    presion_diastolica, sexo, tiene_diabetes y, si existe, cintura. Devuelve {columna: arreglo de NumPy} en el
+    orden del CSV final; las RI_*_categoria son códigos int8 de ETIQUETAS_RI (-1 sin dato)
+    """
+    glucosa = columna_numerica(df, "glucosa")
+    hba1c = columna_numerica(df, "hba1c")
+    hdl = columna_numerica(df, "hdl")
+    trigliceridos = columna_numerica(df, "trigliceridos")
+    sistolica = columna_numerica(df, "presion_sistolica")
+    diastolica = columna_numerica(df, "presion_diastolica")
+    cintura = columna_numerica(df, "cintura")
+    imc = columna_numerica(df, "imc")
+    imc = np.where(np.isnan(imc), columna_numerica(df, "peso") / columna_numerica(df, "talla") ** 2, imc)
+    diabetes = columna_numerica(df, "tiene_diabetes") > 0
+    sexo = codigos_sexo(df, sexo_masculino, sexo_femenino)
+
+    # Criterios compartidos (una comparación con NaN es False: el criterio no se cumple)
+    trigliceridos_altos = trigliceridos >= TRIGLICERIDOS_ALTOS
+    hdl_bajo = hdl < umbral_por_sexo(sexo, HDL_BAJO)
+    presion_alta = (sistolica >= PRESION_ALTA[0]) | (diastolica >= PRESION_ALTA[1])
+    glucosa_alterada = (glucosa >= GLUCOSA_ALTERADA) | diabetes
+
+    resultado = {}
+    resultado["SM_OMS_1999"], resultado["SM_OMS_criterios_n"] = definicion_con_obligatorio(
+        hba1c >= HBA1C_OMS,
+        trigliceridos_altos,
+        hdl < umbral_por_sexo(sexo, HDL_BAJO_OMS),
+        (sistolica >= PRESION_ALTA_OMS[0]) | (diastolica >= PRESION_ALTA_OMS[1]),
+        imc > IMC_OBESIDAD_OMS,
+    )
+    resultado["SM_NCEP_ATP3"], resultado["SM_NCEP_criterios_n"] = definicion_sin_obligatorio(
+        cintura > umbral_por_sexo(sexo, CINTURA_NCEP),
+        trigliceridos_altos, hdl_bajo, presion_alta, glucosa_alterada,
+    )
+    resultado["SM_IDF_2006"], resultado["SM_IDF_criterios_n"] = definicion_con_obligatorio(
+        cintura >= umbral_por_sexo(sexo, CINTURA_IDF),
+        trigliceridos_altos, hdl_bajo, presion_alta, glucosa_alterada,
+    )
+    resultado["SM_AHA_2009"], resultado["SM_AHA_criterios_n"] = definicion_sin_obligatorio(
+        cintura >= umbral_por_sexo(sexo, CINTURA_AHA),
+        trigliceridos_altos, hdl_bajo, presion_alta, glucosa_alterada,
+    )
+    resultado["SM_ALAD_2009"], resultado["SM_ALAD_criterios_n"] = definicion_con_obligatorio(
+        cintura >= umbral_por_sexo(sexo, CINTURA_ALAD),
+        trigliceridos_altos, hdl_bajo, presion_alta, glucosa_alterada,
+    )
+
+    # Índices de resistencia a la insulina (NaN si falta alguno de sus laboratorios)
+    indices = {}
+    indices["TyG"] = np.log(trigliceridos * glucosa / 2)
+    indices["TyG_IMC"] = indices["TyG"] * imc
+    indices["TG_HDL"] = trigliceridos / hdl
+    indices["METS_IR"] = np.log(2 * glucosa + trigliceridos) * imc / np.log(hdl)
+    for indice, columna in COLUMNAS_INDICES_RI.items():
+        resultado[columna] = indices[indice]
+
+    positivos = []
+    for indice, valores in indices.items():
+        codigos = categorizar_indice(valores, CORTES_RI[indice])
+        positivos.append(codigos >= CODIGO_RI_POSITIVO)
+        resultado[f"RI_{indice}"] = positivos[-1].astype(np.int8)
+        resultado[f"RI_{indice}_categoria"] = codigos
+    resultado["RI_consenso_n_indices"] = contar_criterios(*positivos)
+    resultado["RI_diagnostico_consenso"] = (
+        resultado["RI_consenso_n_indices"] >= INDICES_MINIMOS_CONSENSO).astype(np.int8)
+    return resultado
+
+
+def agregar_indices_metabolicos(df, sexo_masculino=SEXO_MASCULINO, sexo_femenino=SEXO_FEMENINO):
+    """Copia del DataFrame con las columnas SM_* e índices RI_* (reemplaza las que ya existan)"""
+    columnas = calcular_indices_metabolicos(df, sexo_masculino, sexo_femenino)
+    for nombre, valores in columnas.items():
+        if nombre.endswith("_categoria"):
+            columnas[nombre] = pd.Categorical.from_codes(valores, ETIQUETAS_RI)
+    return df.assign(**{nombre: pd.Series(valores, index=df.index) for nombre, valores in columnas.items()})
@@ -0,0 +1,199 @@
+import os
+import re
+import csv
+import sys
+import time
+from datetime import datetime, date
+from collections import Counter
+
+import pandas as pd
+
+import DADO
+from clasificador import plegar_acentos
+
+# openpyxl es opcional: solo se necesita para leer el libro de Excel original
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Ingesta del libro de Excel que llega cada mes: las hojas de interés se leen fila a fila en modo de solo
+# lectura (openpyxl read_only, que no carga el libro completo) y van directo a los tres CSV que lee main(),
+# o por bloques al clasificador. La memoria no crece con el tamaño del libro
+
+
+# Hojas de interés (comparadas sin tildes, espacios, guiones ni mayúsculas) y archivo de entrada de main()
+# que genera cada una; las demás hojas del libro se omiten
+LIBROS_DE_INTERES = {
+    "Antihipertensivos1": "Antihipertensivos1.csv",
+    "Antihipertensivos2": "Antihipertensivos2.csv",
+    "OtrosMedicamentos": "OtrosMedicamentos.csv",
+}
+
+# Carpeta de los archivos de entrada de main()
+DIRECTORIO_ENTRADAS = "full_size"
+
+# Separador de los CSV generados (el de los extractos) y su encoding: utf-8 a propósito, aunque los extractos
+# vienen en latin-1, porque las celdas de Excel pueden traer caracteres que latin-1 no representa ("–", "€").
+# main() detecta el encoding de cada archivo, así que lee igual unos y otros
+SEPARADOR_CSV = ";"
+ENCODING_CSV = "utf-8"
+
+# Filas por bloque al clasificar directamente desde el libro
+TAMANO_BLOQUE = 100_000
+
+
+def clave_libro(nombre):
+    """Nombre de hoja sin tildes, espacios, guiones ni mayúsculas ("Otros medicamentos" = "OtrosMedicamentos")"""
+    return re.sub(r"[\W_]+", "", plegar_acentos(str(nombre))).casefold()
+
+
+def texto_de_celda(valor):
+    """Valor de una celda como lo escribe el extracto en CSV
+
+    Fechas como d/m/aaaa (con hora si no es medianoche), números enteros sin ".0" y celdas vacías como ""
+    """
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, datetime):
+        if valor.hour or valor.minute or valor.second:
+            return f"{valor.day}/{valor.month}/{valor.year} {valor:%H:%M:%S}"
+        return f"{valor.day}/{valor.month}/{valor.year}"
+    if isinstance(valor, date):
+        return f"{valor.day}/{valor.month}/{valor.year}"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def hojas_de_interes(libro, libros=LIBROS_DE_INTERES):
+    """Lista de (hoja, archivo de destino) de las hojas de interés del libro, en el orden del libro"""
+    destinos = {clave_libro(nombre): archivo for nombre, archivo in libros.items()}
+    hojas = []
+    for nombre in libro.sheetnames:
+        if clave_libro(nombre) in destinos:
+            hojas.append((libro[nombre], destinos[clave_libro(nombre)]))
+        else:
+            print(f"  Hoja omitida (no es de interés): {nombre}")
+    return hojas
+
+
+def filas_de_hoja(hoja):
+    """Encabezado y generador de filas (textos, con el ancho del encabezado) de una hoja en modo de solo lectura
+
+    Las filas completamente vacías se omiten (incluidas las que el libro declara al final sin contenido)
+    """
+    filas = hoja.iter_rows(values_only=True)
+    encabezado = []
+    for fila in filas:
+        if any(valor is not None for valor in fila):
+            encabezado = [texto_de_celda(valor) for valor in fila]
+            break
+    # Las columnas vacías a la derecha del encabezado no son parte de la tabla
+    while encabezado and encabezado[-1] == "":
+        encabezado.pop()
+    ancho = len(encabezado)
+
+    def generador():
+        for fila in filas:
+            if any(valor is not None for valor in fila):
+                textos = [texto_de_celda(valor) for valor in fila[:ancho]]
+                yield textos + [""] * (ancho - len(textos))
+
+    return encabezado, generador()
+
+
+def abrir_libro(ruta_excel):
+    """Abre el libro en modo de solo lectura (las fórmulas se leen con su último valor calculado)"""
+    if openpyxl is None:
+        raise ImportError("Se necesita openpyxl para leer el libro de Excel (pip install openpyxl)")
+    return openpyxl.load_workbook(ruta_excel, read_only=True, data_only=True)
+
+
+def exportar_libros(ruta_excel, directorio=DIRECTORIO_ENTRADAS, libros=LIBROS_DE_INTERES):
+    """Escribe cada hoja de interés del libro en su CSV de entrada de main(), fila a fila
+
+    Cada CSV se escribe con otro nombre y se renombra al terminar, así una ingesta interrumpida no deja
+    una entrada a medias. Devuelve {archivo CSV: filas escritas}
+    """
+    os.makedirs(directorio, exist_ok=True)
+    libro = abrir_libro(ruta_excel)
+    escritos = {}
+    try:
+        for hoja, archivo in hojas_de_interes(libro, libros):
+            inicio = time.perf_counter()
+            ruta = os.path.join(directorio, archivo)
+            encabezado, filas = filas_de_hoja(hoja)
+            with open(ruta + ".tmp", "w", encoding=ENCODING_CSV, newline="") as f:
+                escritor = csv.writer(f, delimiter=SEPARADOR_CSV, lineterminator="\n")
+                escritor.writerow(encabezado)
+                total = 0
+                for fila in filas:
+                    escritor.writerow(fila)
+                    total += 1
+            os.replace(ruta + ".tmp", ruta)
+            escritos[ruta] = total
+            print(f"✓ Hoja '{hoja.title}' -> {ruta}: {total} registros ({time.perf_counter() - inicio:.2f} s)")
+    finally:
+        libro.close()
+    return escritos
+
+
+def bloques_de_libro(ruta_excel, tamano_bloque=TAMANO_BLOQUE, libros=LIBROS_DE_INTERES):
+    """Genera (archivo de destino, DataFrame de texto) por bloques de cada hoja de interés, como los que
+    procesar_en_streaming lee de los CSV (celdas vacías como NaN)"""
+    libro = abrir_libro(ruta_excel)
+    try:
+        for hoja, archivo in hojas_de_interes(libro, libros):
+            encabezado, filas = filas_de_hoja(hoja)
+            bloque = []
+            for fila in filas:
+                bloque.append(fila)
+                if len(bloque) == tamano_bloque:
+                    yield archivo, pd.DataFrame(bloque, columns=encabezado, dtype=str).replace("", None)
+                    bloque = []
+            if bloque:
+                yield archivo, pd.DataFrame(bloque, columns=encabezado, dtype=str).replace("", None)
+    finally:
+        libro.close()
+
+
+def clasificar_libro(ruta_excel, archivo_salida="registros_clasificados_por_medicamento_final.csv",
+                     tamano_bloque=TAMANO_BLOQUE, libros=LIBROS_DE_INTERES, cache=None):
+    """Clasifica las hojas de interés directamente desde el libro y escribe el CSV final, bloque a bloque
+
+    Cada bloque se estandariza, se clasifica con la caché (cada texto distinto una sola vez) y sus registros
+    de interés se agregan al CSV final, como en procesar_en_streaming. Devuelve el total de registros del
+    final y el conteo por Categorización
+    """
+    if cache is None:
+        cache = DADO.CacheClasificacion()
+    conteo_categorias = Counter()
+    leidos = final = 0
+    med_col = None
+    with open(archivo_salida, "w", encoding="utf-8-sig", newline="") as salida_final:
+        for archivo, bloque in bloques_de_libro(ruta_excel, tamano_bloque, libros):
+            bloque["archivo_origen"] = archivo
+            bloque = DADO.estandarizar_nombres_columnas(bloque, mostrar=False)
+            if med_col is None:
+                _, med_col = DADO.identificar_columnas(bloque)
+            df_final = DADO.seleccionar_registros_de_interes(bloque, cache.clasificar_serie(bloque[med_col]))
+            df_final.to_csv(salida_final, index=False, sep=";", header=leidos == 0)
+            leidos += len(bloque)
+            final += len(df_final)
+            conteo_categorias.update(df_final["Categorización"].value_counts().to_dict())
+            print(f"  {archivo}: {leidos} registros leídos, {final} con medicamentos de interés")
+    print(f"✓ Archivo final generado desde el libro: {archivo_salida} ({final} registros)")
+    return final, conteo_categorias
+
+
+if __name__ == "__main__":
+    # Uso: python ingesta_excel.py libro.xlsx [directorio] [--clasificar]
+    #   sin --clasificar escribe los CSV de entrada de main() en el directorio (full_size/ por defecto)
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if "--clasificar" in sys.argv:
+        clasificar_libro(argumentos[0])
+    else:
+        exportar_libros(argumentos[0], argumentos[1] if len(argumentos) > 1 else DIRECTORIO_ENTRADAS)
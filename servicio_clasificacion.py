@@ -0,0 +1,187 @@
+import sys
+import json
+import time
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import clasificador
+
+
+# Puerto por defecto del modo HTTP (solo escucha en localhost)
+PUERTO_POR_DEFECTO = 8765
+
+# Últimas latencias que se conservan por tipo de petición para calcular los percentiles
+MUESTRAS_LATENCIA = 10_000
+
+PERCENTILES = (50, 90, 99)
+
+# Máximo de textos por petición de lote
+MAXIMO_TEXTOS_LOTE = 100_000
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) de una lista ya ordenada, por el método del rango más cercano"""
+    if not valores_ordenados:
+        return None
+    posicion = max(0, -(-p * len(valores_ordenados) // 100) - 1)
+    return valores_ordenados[posicion]
+
+
+class ServicioClasificacion:
+    """Clasificador de larga duración: catálogo y patrones cargados una vez, caché LRU y latencias por petición"""
+
+    def __init__(self, corrector=None, tamano_cache=100_000, muestras_latencia=MUESTRAS_LATENCIA):
+        self.corrector = corrector
+        self.cache = clasificador.CacheClasificacion(tamano_maximo=tamano_cache, corrector=corrector)
+        self.latencias = {"individual": deque(maxlen=muestras_latencia), "lote": deque(maxlen=muestras_latencia)}
+        self.peticiones = {"individual": 0, "lote": 0, "error": 0}
+        self.textos_clasificados = 0
+        self.inicio = time.time()
+
+    def clasificar(self, texto):
+        """Categorización, grupos encontrados y palabras X de un texto de Medicamento"""
+        resultado = self.cache.obtener(texto)
+        if resultado is None:
+            tokens = clasificador.tokenizar_medicamento(texto, self.corrector)
+            resultado = {
+                "medicamento": texto,
+                "categorizacion": clasificador.categoria_de_tokens(tokens),
+                "grupos": clasificador.grupos_de_mascara(tokens.mascara),
+                "palabras_x": list(tokens.palabras_x),
+                "de_interes": bool(tokens.mascara),
+            }
+            self.cache.agregar(texto, resultado)
+        self.textos_clasificados += 1
+        return resultado
+
+    def atender(self, peticion):
+        """Responde una petición {"texto": ...}, {"textos": [...]} o {"accion": "estadisticas"}"""
+        inicio = time.perf_counter()
+        if peticion.get("accion") == "estadisticas":
+            return self.estadisticas()
+        if isinstance(peticion.get("texto"), str):
+            tipo, respuesta = "individual", self.clasificar(peticion["texto"])
+        elif isinstance(peticion.get("textos"), list):
+            textos = peticion["textos"]
+            if len(textos) > MAXIMO_TEXTOS_LOTE:
+                raise ValueError(f"El lote tiene {len(textos)} textos (máximo {MAXIMO_TEXTOS_LOTE})")
+            if not all(isinstance(texto, str) for texto in textos):
+                raise ValueError("'textos' debe ser una lista de cadenas")
+            tipo, respuesta = "lote", {"resultados": [self.clasificar(texto) for texto in textos]}
+        else:
+            raise ValueError("La petición debe tener 'texto' (cadena), 'textos' (lista) o 'accion'")
+        self.peticiones[tipo] += 1
+        self.latencias[tipo].append(time.perf_counter() - inicio)
+        return respuesta
+
+    def estadisticas(self):
+        """Peticiones atendidas, percentiles de latencia (ms) por tipo y estadísticas de la caché"""
+        latencias = {}
+        for tipo, muestras in self.latencias.items():
+            ordenadas = sorted(muestras)
+            latencias[tipo] = {f"p{p}_ms": None if not ordenadas else round(percentil(ordenadas, p) * 1000, 3)
+                               for p in PERCENTILES}
+            latencias[tipo]["muestras"] = len(ordenadas)
+        return {
+            "segundos_activo": round(time.time() - self.inicio, 1),
+            "peticiones": dict(self.peticiones),
+            "textos_clasificados": self.textos_clasificados,
+            "latencias": latencias,
+            "cache_clasificacion": self.cache.estadisticas(),
+            "correccion_typos": self.corrector is not None,
+        }
+
+
+def crear_manejador(servicio):
+    """Clase de manejador HTTP que atiende las peticiones con el servicio indicado"""
+
+    class Manejador(BaseHTTPRequestHandler):
+        """GET /clasificar?texto=..., POST /clasificar (JSON), GET /estadisticas y GET /salud"""
+
+        def responder(self, estado, contenido):
+            cuerpo = json.dumps(contenido, ensure_ascii=False).encode("utf-8")
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def atender(self, peticion):
+            try:
+                self.responder(200, servicio.atender(peticion))
+            except ValueError as e:
+                servicio.peticiones["error"] += 1
+                self.responder(400, {"error": str(e)})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/clasificar":
+                textos = parse_qs(url.query).get("texto")
+                self.atender({"texto": textos[0]} if textos else {})
+            elif url.path == "/estadisticas":
+                self.responder(200, servicio.estadisticas())
+            elif url.path == "/salud":
+                self.responder(200, {"estado": "ok"})
+            else:
+                self.responder(404, {"error": f"Ruta desconocida: {url.path}"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/clasificar":
+                self.responder(404, {"error": f"Ruta desconocida: {self.path}"})
+                return
+            try:
+                peticion = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError as e:
+                servicio.peticiones["error"] += 1
+                self.responder(400, {"error": f"JSON inválido: {e}"})
+                return
+            self.atender(peticion if isinstance(peticion, dict) else {})
+
+        def log_message(self, formato, *args):
+            # Sin una línea por petición en stderr: las latencias se consultan en /estadisticas
+            pass
+
+    return Manejador
+
+
+def servir_http(servicio, puerto=PUERTO_POR_DEFECTO):
+    """Atiende peticiones HTTP en 127.0.0.1:puerto hasta Ctrl+C"""
+    servidor = HTTPServer(("127.0.0.1", puerto), crear_manejador(servicio))
+    print(f"✓ Servicio de clasificación en http://127.0.0.1:{servidor.server_port}", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(json.dumps(servicio.estadisticas(), ensure_ascii=False), file=sys.stderr)
+
+
+def servir_lineas(servicio, entrada=sys.stdin, salida=sys.stdout):
+    """Protocolo de líneas: cada línea de entrada produce una línea JSON de salida
+
+    Una línea que empieza con "{" es una petición JSON ({"texto": ...}, {"textos": [...]} o
+    {"accion": "estadisticas"}); cualquier otra línea es un texto de Medicamento a clasificar
+    """
+    for linea in entrada:
+        linea = linea.rstrip("\r\n")
+        try:
+            peticion = json.loads(linea) if linea.startswith("{") else {"texto": linea}
+            respuesta = servicio.atender(peticion if isinstance(peticion, dict) else {})
+        except ValueError as e:
+            servicio.peticiones["error"] += 1
+            respuesta = {"error": str(e)}
+        salida.write(json.dumps(respuesta, ensure_ascii=False) + "\n")
+        salida.flush()
+
+
+if __name__ == "__main__":
+    # Uso: python servicio_clasificacion.py [--http [puerto]] [--typos]
+    #   sin --http lee textos o peticiones JSON por stdin y responde una línea JSON por línea en stdout
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    servicio = ServicioClasificacion(corrector=clasificador.CorrectorMedicamentos() if "--typos" in sys.argv else None)
+    if "--http" in sys.argv:
+        servir_http(servicio, int(argumentos[0]) if argumentos else PUERTO_POR_DEFECTO)
+    else:
+        servir_lineas(servicio)